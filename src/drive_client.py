@@ -2,6 +2,7 @@
 
 import asyncio
 import logging
+import random
 import time
 import concurrent.futures
 from typing import List, Dict, Any, Optional
@@ -111,6 +112,7 @@ class DriveClient:
     async def _execute_with_retry(self, request_func, *args, **kwargs):
         """Execute a request with exponential backoff retry using thread pool."""
         executor = await self._get_executor()
+        prev_sleep = 1.0  # base_delay = 1.0
         
         for attempt in range(3 + 1):  # max_retries = 3
             try:
@@ -129,9 +131,11 @@ class DriveClient:
             except HttpError as e:
                 if e.resp.status in [429, 500, 502, 503, 504]:
                     if attempt < 3:  # max_retries
-                        delay = 1.0 * (2 ** attempt)  # base_delay = 1.0
+                        # Decorrelated jitter: [base_delay, prev_sleep * 3], capped at 32s, so clients
+                        # that hit a 429 together do not retry in lockstep
+                        delay = prev_sleep = min(32.0, random.uniform(1.0, prev_sleep * 3))
                         logger.warning(
-                            f"DriveClient[{self._instance_id}]: Request failed with {e.resp.status}, retrying in {delay}s "
+                            f"DriveClient[{self._instance_id}]: Request failed with {e.resp.status}, retrying in {delay:.2f}s "
                             f"(attempt {attempt + 1}/{3 + 1})"
                         )
                         await asyncio.sleep(delay)
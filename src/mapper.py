@@ -2,6 +2,7 @@
 
 import logging
 import re
+from dataclasses import replace
 from decimal import Decimal, InvalidOperation
 from typing import List, Dict, Any, Optional, Tuple
 
@@ -164,21 +165,7 @@ class RowMapper:
             # Create one copy of this record for each applicable tax_type
             for tax_type in tax_types:
                 # Create a new record with the same data but different tax_type
-                expanded_record = Record(
-                    geocode=record.geocode,
-                    tax_auth_id=record.tax_auth_id,
-                    group=record.group,
-                    item=record.item,
-                    customer=record.customer,
-                    provider=record.provider,
-                    transaction=record.transaction,
-                    taxable=record.taxable,
-                    tax_type=tax_type,  # This is the only field that changes
-                    tax_cat=record.tax_cat,
-                    effective=record.effective,
-                    per_taxable_type=record.per_taxable_type,
-                    percent_taxable=record.percent_taxable
-                )
+                expanded_record = replace(record, tax_type=tax_type)
                 expanded_records.append(expanded_record)
             
             logger.debug(f"Expanded record {record.item} (geocode={record.geocode}, customer={record.customer}, tax_cat={record.tax_cat}) into {len(tax_types)} records using tax types: {tax_types}")
@@ -3,8 +3,10 @@
 import csv
 import io
 import logging
+from dataclasses import dataclass, field
 from decimal import Decimal
 from enum import Enum
+from functools import lru_cache
 from typing import Dict, List, Optional, Union, Any, Set, Tuple
 
 import boto3
@@ -63,26 +65,61 @@ class TaxableValue(int, Enum):
     DRILL_DOWN = -1
 
 
+def _quote_csv_field(value: str) -> str:
+    """Wrap a value in double quotes, escaping any internal quotes by doubling them."""
+    return '"' + value.replace('"', '""') + '"'
+
+
+@lru_cache(maxsize=4096)
+def _parent_geocode_str(geocode: str) -> str:
+    """Construct parent state geocode from city geocode (cached: few distinct geocodes, many records)."""
+    if len(geocode) >= 4:
+        # Extract first 4 characters + "00000000"
+        return geocode[:4] + "00000000"
+    else:
+        # For short geocodes, pad with zeros to make 4 characters, then add "00000000"
+        logger.warning(f"Short geocode format for parent construction: '{geocode}' - padding")
+        padded_prefix = geocode.ljust(4, '0')  # Pad right with zeros to make 4 chars
+        return padded_prefix + "00000000"
+
+
+@dataclass(slots=True, frozen=True)
 class Record:
-    """Represents a single CSV record for matrix_update.csv output."""
-    
-    def __init__(self, geocode: str, tax_auth_id: str, group: str, item: str, 
-                 customer: str, provider: str, transaction: str, taxable: int,
-                 tax_type: str, tax_cat: str, effective: str, per_taxable_type: str,
-                 percent_taxable: str):
-        self.geocode = geocode
-        self.tax_auth_id = tax_auth_id
-        self.group = group
-        self.item = item
-        self.customer = customer
-        self.provider = provider
-        self.transaction = transaction
-        self.taxable = taxable
-        self.tax_type = tax_type
-        self.tax_cat = tax_cat
-        self.effective = effective
-        self.per_taxable_type = per_taxable_type
-        self.percent_taxable = percent_taxable
+    """Represents a single CSV record for matrix_update.csv output.
+    
+    Immutable and slotted: records are multiplied per geocode, tax type and
+    replicated city, so derive variants with dataclasses.replace(), or with
+    with_geocode() on the state-to-city replication fast path.
+    """
+    
+    geocode: str
+    tax_auth_id: str
+    group: str
+    item: str
+    customer: str
+    provider: str
+    transaction: str
+    taxable: int
+    tax_type: str
+    tax_cat: str
+    effective: str
+    per_taxable_type: str
+    percent_taxable: str
+    is_city: bool = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # City-level geocodes are anything below state level ("US17" + "00000000")
+        object.__setattr__(self, 'is_city', not self.geocode.endswith("00000000"))
+
+    def with_geocode(self, geocode: str) -> "Record":
+        """Copy of this record for another geocode.
+        
+        Equivalent to dataclasses.replace(self, geocode=geocode) but calls the constructor
+        directly, avoiding replace()'s per-call field introspection on the replication path.
+        """
+        return Record(geocode, self.tax_auth_id, self.group, self.item, self.customer, self.provider,
+                      self.transaction, self.taxable, self.tax_type, self.tax_cat, self.effective,
+                      self.per_taxable_type, self.percent_taxable)
 
     @staticmethod
     def csv_headers() -> List[str]:
@@ -118,25 +155,29 @@ class Record:
 class ProductItem:
     """Represents a product item for the product_item_update.csv output."""
     
+    # Product items are created per sheet row, so skip the per-instance __dict__
+    __slots__ = ("item", "description")
+    
+    group = "7777"  # Always 7777 as specified (class-level constant, not a slot)
+    
+    # Column names of product_item_update.csv, shared by csv_headers() and the orchestrator's writer
+    CSV_FIELDS = ("group", "item", "description")
+    
+    # Pre-quoted group value shared by every CSV row
+    _GROUP_CSV = _quote_csv_field(group)
+    
     def __init__(self, item_id: str, description: str):
-        self.group = "7777"  # Always 7777 as specified
         self.item = item_id.strip() if item_id else ""
         self.description = description.strip() if description else ""
     
     @staticmethod
     def csv_headers() -> List[str]:
         """Return CSV headers for product item output."""
-        return ['"group"', '"item"', '"description"']
+        return [_quote_csv_field(name) for name in ProductItem.CSV_FIELDS]
     
     def to_csv_row(self) -> List[str]:
         """Convert product item to CSV row with proper quoting."""
-        # Escape any internal quotes by doubling them
-        escaped_description = self.description.replace('"', '""')
-        return [
-            f'"{self.group}"',
-            f'"{self.item}"',
-            f'"{escaped_description}"'
-        ]
+        return [ProductItem._GROUP_CSV, _quote_csv_field(self.item), _quote_csv_field(self.description)]
     
     def is_valid(self) -> bool:
         """Check if this product item has valid data."""
@@ -521,14 +562,7 @@ class LookupTables:
     
     def _construct_parent_geocode(self, geocode: str) -> str:
         """Construct parent state geocode from city geocode."""
-        if len(geocode) >= 4:
-            # Extract first 4 characters + "00000000"
-            return geocode[:4] + "00000000"
-        else:
-            # For short geocodes, pad with zeros to make 4 characters, then add "00000000"
-            logger.warning(f"Short geocode format for parent construction: '{geocode}' - padding")
-            padded_prefix = geocode.ljust(4, '0')  # Pad right with zeros to make 4 chars
-            return padded_prefix + "00000000"
+        return _parent_geocode_str(geocode)
     
     def get_tax_types_with_hierarchy_fallback(self, geocode: str, tax_cat: str) -> Optional[List[str]]:
         """Get tax types with direct lookup only (no parent geocode fallback)."""
@@ -2,16 +2,20 @@
 
 import asyncio
 import csv
+import functools
 import io
 import json
 import logging
 import os
+from collections import defaultdict
+from dataclasses import replace
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 import boto3
 import pytz
+from boto3.s3.transfer import TransferConfig
 
 from .config import config
 from .drive_client import DriveClient
@@ -22,6 +26,10 @@ from .models import Record, ProductItem, LookupTables
 
 logger = logging.getLogger(__name__)
 
+# Maximum concurrent static file uploads (boto3's default connection pool is 10)
+STATIC_UPLOAD_CONCURRENCY = 8
+STATIC_UPLOAD_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=4)
+
 
 class ResearchDataOrchestrator:
     """Main orchestrator for processing Google Sheets and generating CSV output."""
@@ -63,13 +71,12 @@ class ResearchDataOrchestrator:
     
     def _deduplicate_product_items(self, product_items: List[ProductItem]) -> List[ProductItem]:
         """Remove duplicate product items, keeping first occurrence of each item ID."""
-        seen_items: Set[str] = set()
-        unique_items: List[ProductItem] = []
-        
+        # Key on the item ID directly (one hash per item, no ProductItem.__hash__/__eq__ calls);
+        # setdefault keeps the first occurrence and dict order preserves input order
+        unique_by_id: Dict[str, ProductItem] = {}
         for item in product_items:
-            if item.item not in seen_items:
-                seen_items.add(item.item)
-                unique_items.append(item)
+            unique_by_id.setdefault(item.item, item)
+        unique_items = list(unique_by_id.values())
         
         logger.info(f"Deduplicated product items: {len(product_items)} -> {len(unique_items)} unique items")
         return unique_items
@@ -78,14 +85,14 @@ class ResearchDataOrchestrator:
         """Create CSV content from product items."""
         output = io.StringIO()
         
+        # QUOTE_ALL reproduces ProductItem.to_csv_row() quoting (including "" escaping) in C
+        writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        
         # Write header row
-        headers = ProductItem.csv_headers()
-        output.write(','.join(headers) + '\n')
+        writer.writerow(ProductItem.CSV_FIELDS)
         
-        # Write data rows
-        for item in product_items:
-            csv_row = item.to_csv_row()
-            output.write(','.join(csv_row) + '\n')
+        # Write data rows straight from the items, skipping the pre-quoted row lists
+        writer.writerows((item.group, item.item, item.description) for item in product_items)
         
         content = output.getvalue()
         output.close()
@@ -144,7 +151,9 @@ class ResearchDataOrchestrator:
             return static_file_keys
         
         # Find all CSV files in the data directory
-        csv_files = list(data_dir.glob("*.csv"))
+        # scandir yields names and cached file types in one pass, no Path/stat per entry
+        with os.scandir(data_dir) as entries:
+            csv_files = [entry for entry in entries if entry.name.endswith(".csv") and entry.is_file()]
         
         if not csv_files:
             logger.warning(f"No CSV files found in data directory: {data_dir}")
@@ -152,30 +161,38 @@ class ResearchDataOrchestrator:
         
         logger.info(f"Found {len(csv_files)} static CSV files to upload")
         
-        for file_path in csv_files:
-            try:
-                # Read file content
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
-                
-                # Create S3 key using the original filename
-                key = f"{output_folder}/{file_path.name}"
-                
-                # Upload to S3
-                self.s3_client.put_object(
-                    Bucket=config.s3_bucket,
-                    Key=key,
-                    Body=file_content.encode('utf-8'),
-                    ContentType='text/csv'
-                )
-                
-                static_file_keys.append(key)
-                logger.info(f"Successfully uploaded static file to s3://{config.s3_bucket}/{key}")
-                
-            except Exception as e:
-                logger.error(f"Error uploading static file {file_path.name}: {e}")
-                # Continue with other files - don't let one failure stop the process
-                continue
+        # Upload concurrently: each put_object is a blocking round trip, so run them
+        # in the default executor, capped to stay within boto3's connection pool
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(STATIC_UPLOAD_CONCURRENCY)
+        
+        async def upload_with_semaphore(file_entry: os.DirEntry) -> Optional[str]:
+            """Upload a single static file, returning its S3 key or None on failure."""
+            async with semaphore:
+                try:
+                    # Create S3 key using the original filename
+                    key = f"{output_folder}/{file_entry.name}"
+                    
+                    # Stream from disk to S3 (multipart above the threshold) rather than reading into memory
+                    await loop.run_in_executor(None, functools.partial(
+                        self.s3_client.upload_file,
+                        file_entry.path,
+                        config.s3_bucket,
+                        key,
+                        ExtraArgs={'ContentType': 'text/csv'},
+                        Config=STATIC_UPLOAD_TRANSFER_CONFIG
+                    ))
+                    
+                    logger.info(f"Successfully uploaded static file to s3://{config.s3_bucket}/{key}")
+                    return key
+                    
+                except Exception as e:
+                    logger.error(f"Error uploading static file {file_entry.name}: {e}")
+                    # Don't let one failure stop the other uploads
+                    return None
+        
+        results = await asyncio.gather(*(upload_with_semaphore(file_entry) for file_entry in csv_files))
+        static_file_keys = [key for key in results if key is not None]
         
         return static_file_keys
     
@@ -185,22 +202,8 @@ class ResearchDataOrchestrator:
         for record in records:
             converted_code = self.lookup_tables.product_code_mapper.convert_research_id(record.item)
             if converted_code:  # Only include records with mapped research_ids
-                # Create new record with converted item code
-                converted_record = Record(
-                    geocode=record.geocode,
-                    tax_auth_id=record.tax_auth_id,
-                    group=record.group,
-                    item=converted_code,  # ← 3-CHARACTER PADDED CODE HERE
-                    customer=record.customer,
-                    provider=record.provider,
-                    transaction=record.transaction,
-                    taxable=record.taxable,
-                    tax_type=record.tax_type,
-                    tax_cat=record.tax_cat,
-                    effective=record.effective,
-                    per_taxable_type=record.per_taxable_type,
-                    percent_taxable=record.percent_taxable
-                )
+                # Create new record with converted item code (3-character padded code)
+                converted_record = replace(record, item=converted_code)
                 filtered_records.append(converted_record)
             # Unmapped IDs are automatically tracked in ProductCodeMapper
         return filtered_records
@@ -256,64 +259,54 @@ class ResearchDataOrchestrator:
     
     def _identify_city_records(self, records: List[Record]) -> List[Record]:
         """Identify records with city-level geocodes (not ending in '00000000')."""
-        city_records = []
-        for record in records:
-            if not record.geocode.endswith("00000000"):
-                city_records.append(record)
+        city_records = [record for record in records if record.is_city]
         
         logger.debug(f"Identified {len(city_records)} city-level records out of {len(records)} total records")
         return city_records
     
-    def _find_matching_state_treatments(self, city_record: Record, all_records: List[Record]) -> List[Record]:
+    def _build_state_index(self, records: List[Record]) -> Dict[tuple, List[Record]]:
+        """Bucket state-level records by (geocode, group, item, customer, provider) for O(1) matching."""
+        state_index: Dict[tuple, List[Record]] = {}
+        for record in records:
+            if not record.is_city:
+                key = (record.geocode, record.group, record.item, record.customer, record.provider)
+                state_index.setdefault(key, []).append(record)
+        return state_index
+    
+    def _find_matching_state_treatments(self, city_record: Record, all_records: List[Record],
+                                        state_index: Optional[Dict[tuple, List[Record]]] = None) -> List[Record]:
         """Find state records with same group/item/customer/provider but NOT exact tax_type+tax_cat composite key match."""
+        # Build the index on demand; replication passes a prebuilt one shared across all city records
+        if state_index is None:
+            state_index = self._build_state_index(all_records)
+        
         # Construct parent state geocode from city geocode
         parent_geocode = self.lookup_tables._construct_parent_geocode(city_record.geocode)
         
-        matching_records = []
-        for record in all_records:
-            # Check if this is a state record for the parent geocode
-            if record.geocode != parent_geocode:
-                continue
-            
-            # Check if core fields match
-            if (record.group == city_record.group and 
-                record.item == city_record.item and
-                record.customer == city_record.customer and
-                record.provider == city_record.provider):
-                
-                # Exclude only exact composite key matches (both tax_type AND tax_cat match)
-                if not (record.tax_type == city_record.tax_type and record.tax_cat == city_record.tax_cat):
-                    matching_records.append(record)
+        # State records for the parent geocode whose core fields match
+        candidates = state_index.get(
+            (parent_geocode, city_record.group, city_record.item, city_record.customer, city_record.provider), ()
+        )
+        
+        # Exclude only exact composite key matches (both tax_type AND tax_cat match)
+        matching_records = [
+            record for record in candidates
+            if not (record.tax_type == city_record.tax_type and record.tax_cat == city_record.tax_cat)
+        ]
         
         logger.debug(f"Found {len(matching_records)} matching state treatments for city record {city_record.item} (geocode: {city_record.geocode})")
         return matching_records
     
     def _create_city_treatment_record(self, state_record: Record, city_geocode: str) -> Record:
         """Clone state record but replace geocode with city geocode."""
-        return Record(
-            geocode=city_geocode,  # Replace with city geocode
-            tax_auth_id=state_record.tax_auth_id,
-            group=state_record.group,
-            item=state_record.item,
-            customer=state_record.customer,
-            provider=state_record.provider,
-            transaction=state_record.transaction,
-            taxable=state_record.taxable,
-            tax_type=state_record.tax_type,
-            tax_cat=state_record.tax_cat,
-            effective=state_record.effective,
-            per_taxable_type=state_record.per_taxable_type,
-            percent_taxable=state_record.percent_taxable
-        )
+        return state_record.with_geocode(city_geocode)
     
     def _group_missing_treatments_by_city(self, missing_treatments: List[tuple]) -> Dict[str, List[Record]]:
         """Group city records without matching state treatments for error reporting."""
-        grouped = {}
+        grouped = defaultdict(list)
         for city_geocode, city_record in missing_treatments:
-            if city_geocode not in grouped:
-                grouped[city_geocode] = []
             grouped[city_geocode].append(city_record)
-        return grouped
+        return dict(grouped)
     
     def _replicate_state_tax_treatments_to_cities(self, all_records: List[Record]) -> tuple:
         """
@@ -333,11 +326,13 @@ class ResearchDataOrchestrator:
         logger.info(f"Replicating state treatments for {len(city_records)} city records")
         
         # Step 2: For each city record, find and replicate matching state treatments
+        # (state records are indexed once so each lookup is O(1) instead of a full scan)
+        state_index = self._build_state_index(all_records)
         replicated_records = []
         missing_treatments = []  # Track cities without any matching state treatments
         
         for city_record in city_records:
-            matching_state_records = self._find_matching_state_treatments(city_record, all_records)
+            matching_state_records = self._find_matching_state_treatments(city_record, all_records, state_index)
             
             if matching_state_records:
                 # Replicate each matching state treatment to the city geocode
@@ -3,12 +3,17 @@
 import csv
 import io
 import logging
-from typing import Dict, List, Optional, Set
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import boto3
 
 logger = logging.getLogger(__name__)
 
+# Matches one or more trailing ".0" segments, e.g. the ".0.0.0" in "1.1.1.4.3.0.0.0"
+_TRAILING_ZERO_SEGMENTS_RE = re.compile(r'(?:\.0)+$')
+
 
 class ProductCodeMapper:
     """Service for mapping research_ids to 3-character product codes."""
@@ -20,13 +25,21 @@ class ProductCodeMapper:
         # Mapping from normalized research_id to item code
         self.mapping: Dict[str, str] = {}
         
-        # Track unmapped research_ids for error reporting
+        # Track unmapped research_ids for error reporting (add only via _track_unmapped)
         self.unmapped_ids: Set[str] = set()
+        
+        # Sorted snapshot of unmapped_ids, invalidated by _track_unmapped
+        self._unmapped_sorted: Optional[List[str]] = None
     
-    def _normalize_research_id(self, research_id: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _normalize_research_id(research_id: str) -> str:
         """
         Normalize research_id by removing trailing .0 segments for matching.
         
+        Pure function of its input, so results are memoized: research IDs
+        repeat heavily across rows and sheets.
+        
         Examples:
             "1.1.1.4.3.0.0.0" -> "1.1.1.4.3"
             "1.1.0.0.0.0.0.0" -> "1.1"
@@ -41,18 +54,20 @@ class ProductCodeMapper:
         if not research_id:
             return ""
         
-        # Split into parts
-        parts = research_id.strip().split('.')
+        stripped = research_id.strip()
+        
+        # Fast path: nothing to remove without a ".0" segment
+        if '.0' not in stripped:
+            return stripped
         
         # Remove trailing .0 segments
-        while parts and parts[-1] == '0':
-            parts.pop()
+        normalized = _TRAILING_ZERO_SEGMENTS_RE.sub('', stripped)
         
-        # Return normalized ID, or original if all were zeros
-        if not parts:
-            return research_id.strip()
+        # Return original if all segments were zeros
+        if normalized == '0':
+            return stripped
         
-        return '.'.join(parts)
+        return normalized
     
     def _pad_item_code(self, item_code: str) -> str:
         """
@@ -70,18 +85,35 @@ class ProductCodeMapper:
         Returns:
             3-character padded code
         """
-        if not item_code:
-            return "000"
-        
-        code = item_code.strip()
+        code = item_code.strip() if item_code else ""
         
         if len(code) > 3:
             logger.warning(f"Item code '{code}' is longer than 3 characters - not truncating")
-            return code
         
-        # Pad with leading zeros to exactly 3 characters
+        # Pad with leading zeros to 3 characters ("" -> "000"; longer codes pass through unchanged)
         return code.zfill(3)
     
+    def _iter_mapping_rows(self, csv_reader) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (research_id, item_code) for each usable mapping row, logging skipped rows.
+        
+        Expected columns: research_id, taxonomy_id, product_id, group, item, description;
+        we need research_id (col 0) -> item (col 4).
+        """
+        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 since we skipped header
+            if len(row) < 5:  # Need at least 5 columns (0-4)
+                logger.warning(f"Row {row_num}: Insufficient columns ({len(row)}), skipping")
+                continue
+            
+            research_id = row[0].strip().strip('"')
+            item_code = row[4].strip().strip('"')
+            
+            if not research_id or not item_code:
+                logger.warning(f"Row {row_num}: Empty research_id or item_code, skipping")
+                continue
+            
+            yield research_id, item_code
+    
     async def load_mapping(self) -> None:
         """Load product code mapping from S3."""
         try:
@@ -101,40 +133,14 @@ class ProductCodeMapper:
                 logger.error("Product code mapping CSV is empty")
                 return
             
-            # Expected columns: research_id, taxonomy_id, product_id, group, item, description
-            # We need research_id (col 0) -> item (col 4)
-            mapping_count = 0
-            
-            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 since we skipped header
-                try:
-                    if len(row) < 5:  # Need at least 5 columns (0-4)
-                        logger.warning(f"Row {row_num}: Insufficient columns ({len(row)}), skipping")
-                        continue
-                    
-                    research_id = row[0].strip().strip('"')
-                    item_code = row[4].strip().strip('"')
-                    
-                    if not research_id or not item_code:
-                        logger.warning(f"Row {row_num}: Empty research_id or item_code, skipping")
-                        continue
-                    
-                    # Normalize research_id for lookup
-                    normalized_id = self._normalize_research_id(research_id)
-                    
-                    # Pad item code to 3 characters
-                    padded_code = self._pad_item_code(item_code)
-                    
-                    # Store in mapping
-                    self.mapping[normalized_id] = padded_code
-                    mapping_count += 1
-                    
-                    logger.debug(f"Mapped '{research_id}' -> '{normalized_id}' -> '{padded_code}'")
-                    
-                except Exception as e:
-                    logger.warning(f"Row {row_num}: Error processing row {row}: {e}")
-                    continue
+            # Build the normalized_id -> padded_code mapping in one pass over the validated rows
+            # (later rows overwrite earlier ones that normalize to the same key)
+            self.mapping = {
+                self._normalize_research_id(research_id): self._pad_item_code(item_code)
+                for research_id, item_code in self._iter_mapping_rows(csv_reader)
+            }
             
-            logger.info(f"Successfully loaded {mapping_count} product code mappings from {s3_key}")
+            logger.info(f"Successfully loaded {len(self.mapping)} product code mappings from {s3_key}")
             logger.info(f"Sample mappings: {dict(list(self.mapping.items())[:3])}")
             
         except Exception as e:
@@ -155,7 +161,7 @@ class ProductCodeMapper:
         if not research_id:
             # Track empty/None inputs as unmapped for error reporting
             if research_id is not None:  # Only track empty strings, not None
-                self.unmapped_ids.add(research_id)
+                self._track_unmapped(research_id)
             return None
         
         # Normalize for lookup
@@ -169,10 +175,16 @@ class ProductCodeMapper:
             return item_code
         else:
             # Track unmapped ID (use original, not normalized)
-            self.unmapped_ids.add(research_id)
+            self._track_unmapped(research_id)
             logger.debug(f"No mapping found for '{research_id}' (normalized: '{normalized_id}')")
             return None
     
+    def _track_unmapped(self, research_id: str) -> None:
+        """Record an unmapped research_id, invalidating the sorted snapshot on change."""
+        if research_id not in self.unmapped_ids:
+            self.unmapped_ids.add(research_id)
+            self._unmapped_sorted = None
+    
     def get_unmapped_ids(self) -> List[str]:
         """
         Get list of original unmapped research_ids for error reporting.
@@ -180,7 +192,10 @@ class ProductCodeMapper:
         Returns:
             Sorted list of research_ids that could not be mapped
         """
-        return sorted(list(self.unmapped_ids))
+        if self._unmapped_sorted is None:
+            self._unmapped_sorted = sorted(self.unmapped_ids)
+        
+        return list(self._unmapped_sorted)
     
     def get_mapping_stats(self) -> Dict[str, int]:
         """
@@ -0,0 +1,56 @@
+"""Client-side rate limiting for Google API requests."""
+
+import asyncio
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: allows bursts up to capacity, then refill_rate requests per second.
+
+    Requests wait for a token before they are sent, so the client stays under the API
+    quota instead of discovering it through 429 responses and backing off.
+    """
+
+    def __init__(self, capacity: int, refill_rate: float, clock: Optional[Callable[[], float]] = None):
+        """
+        Args:
+            capacity: Maximum number of tokens (burst size); the bucket starts full
+            refill_rate: Tokens added per second
+            clock: Monotonic time source in seconds (defaults to the running event loop's clock)
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._last_refill: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _now(self) -> float:
+        """Current time from the injected clock or the event loop."""
+        if self._clock is not None:
+            return self._clock()
+        return asyncio.get_running_loop().time()
+
+    def _refill(self, now: float):
+        """Add tokens for the time elapsed since the last refill."""
+        if self._last_refill is not None:
+            elapsed = now - self._last_refill
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_rate)
+        self._last_refill = now
+
+    async def acquire(self):
+        """Take one token, sleeping until one is available."""
+        async with self._lock:
+            self._refill(self._now())
+
+            # Take the token up front; a negative balance is the time owed before it is due.
+            # Re-checking the balance after sleeping can spin on float rounding just below 1.
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait_time = -self._tokens / self.refill_rate
+                logger.debug(f"Token bucket empty, waiting {wait_time:.3f}s")
+                await asyncio.sleep(wait_time)
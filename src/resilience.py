@@ -0,0 +1,84 @@
+"""Failure isolation for Google API requests."""
+
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is rejected because the circuit breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker with closed, open and half-open states.
+
+    After failure_threshold consecutive failures the circuit opens and requests are
+    rejected immediately. Once reset_timeout has elapsed it becomes half-open and lets a
+    single trial request through: a success closes the circuit, a failure re-opens it.
+    Other requests are rejected until the trial's result is recorded.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Optional[Callable[[], float]] = None):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before allowing a trial request
+            clock: Monotonic time source in seconds (defaults to time.monotonic)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock or time.monotonic
+        self._failure_count = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the reset timeout has elapsed."""
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now; in half-open only the first caller gets the trial."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        """Close the circuit and reset the failure count."""
+        if self._opened_at is not None:
+            logger.info("Circuit breaker closed after successful trial request")
+        self._failure_count = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a half-open trial without a verdict (non-rate-limit error or cancellation)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failure, opening (or re-opening) the circuit at the threshold."""
+        self._failure_count += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self._failure_count >= self.failure_threshold:
+            self._opened_at = self._clock()
+            logger.warning(
+                f"Circuit breaker open after {self._failure_count} consecutive failures, "
+                f"rejecting requests for {self.reset_timeout}s"
+            )
@@ -2,9 +2,9 @@
 
 import asyncio
 import logging
-import time
+import random
 import concurrent.futures
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from google.auth.transport.requests import Request
 import google.auth
@@ -12,9 +12,23 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from .config import config
+from .rate_limiter import TokenBucket
+from .resilience import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+# Expected column keys and their configured header names (config is fixed at import)
+HEADER_COLUMNS: Dict[str, str] = {
+    'admin': config.admin_column,
+    'current_id': config.col_current_id,
+    'business_use': config.col_business_use,
+    'personal_use': config.col_personal_use,
+    'personal_tax_cat': config.col_personal_tax_cat,
+    'personal_percent_tax': config.col_personal_percent_tax,
+    'business_tax_cat': config.col_business_tax_cat,
+    'business_percent_tax': config.col_business_percent_tax
+}
+
 
 class SheetsClient:
     """Google Sheets API client with rate limiting and retry logic."""
@@ -24,8 +38,11 @@ class SheetsClient:
     _executor_lock = asyncio.Lock()
     
     # Class-level rate limiting for all instances (shared across all clients)
-    _last_request_time = 0
-    _rate_limit_lock = asyncio.Lock()
+    # Google Sheets API read quota: 60 requests per minute per user.
+    # Any 60s window admits at most capacity + refill_rate * 60 = 5 + 55 = 60 requests.
+    _token_bucket = TokenBucket(capacity=5, refill_rate=55 / 60)
+    # Stop sending requests after repeated rate-limit failures instead of backing off per request
+    _circuit_breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60.0)
     
     def __init__(self, max_retries: int = 3, base_delay: float = 1.0):
         self.max_retries = max_retries
@@ -75,24 +92,6 @@ class SheetsClient:
             credentials = self._get_credentials()
             self.service = build('sheets', 'v4', credentials=credentials)
     
-    @classmethod
-    async def _global_rate_limit(cls):
-        """Implement class-level rate limiting shared across all instances."""
-        async with cls._rate_limit_lock:
-            current_time = time.time()
-            time_since_last = current_time - cls._last_request_time
-            
-            # Google Sheets API rate limit: 60 requests per minute = 1 request per second
-            # Add a small buffer to be safe: 1.1 seconds between requests
-            min_interval = 1.1  # 1.1 seconds between requests globally
-            
-            if time_since_last < min_interval:
-                sleep_time = min_interval - time_since_last
-                logger.info(f"Global rate limiting: sleeping {sleep_time:.2f}s to respect API limits")
-                await asyncio.sleep(sleep_time)
-            
-            cls._last_request_time = time.time()
-    
     def _execute_request_sync(self, request_func, *args, **kwargs):
         """Execute a synchronous request in a thread."""
         try:
@@ -105,41 +104,62 @@ class SheetsClient:
     
     async def _execute_with_retry(self, request_func, *args, **kwargs):
         """Execute a request with exponential backoff retry using thread pool."""
+        # Whether this request takes the half-open trial slot (no await before allow_request)
+        is_trial = self._circuit_breaker.state == CircuitBreaker.HALF_OPEN
+        if not self._circuit_breaker.allow_request():
+            raise CircuitOpenError(
+                f"SheetsClient[{self._instance_id}]: Circuit breaker open after repeated rate-limit failures, "
+                f"request rejected"
+            )
         
-        for attempt in range(self.max_retries + 1):
-            try:
-                # Apply global rate limiting only once per request
-                await self._global_rate_limit()
-                
-                # Execute the request in a thread pool for concurrent operations
-                executor = await self._get_executor()
-                import functools
-                callable_func = functools.partial(self._execute_request_sync, request_func, *args, **kwargs)
-                
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(executor, callable_func)
-                
-                return result
-                
-            except HttpError as e:
-                if e.resp.status in [429, 500, 502, 503, 504]:
-                    if attempt < self.max_retries:
-                        delay = self.base_delay * (2 ** attempt)
-                        logger.warning(
-                            f"SheetsClient[{self._instance_id}]: Request failed with {e.resp.status}, retrying in {delay}s "
-                            f"(attempt {attempt + 1}/{self.max_retries + 1})"
-                        )
-                        await asyncio.sleep(delay)
-                        continue
+        verdict_recorded = False
+        prev_sleep = self.base_delay
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    # Wait for a token from the shared bucket so requests stay under quota
+                    await self._token_bucket.acquire()
+                    
+                    # Execute the request in a thread pool for concurrent operations
+                    executor = await self._get_executor()
+                    import functools
+                    callable_func = functools.partial(self._execute_request_sync, request_func, *args, **kwargs)
+                    
+                    loop = asyncio.get_event_loop()
+                    result = await loop.run_in_executor(executor, callable_func)
+                    
+                    self._circuit_breaker.record_success()
+                    verdict_recorded = True
+                    return result
+                    
+                except HttpError as e:
+                    if e.resp.status in [429, 500, 502, 503, 504]:
+                        if attempt < self.max_retries:
+                            delay = prev_sleep = self._decorrelated_jitter(prev_sleep)
+                            logger.warning(
+                                f"SheetsClient[{self._instance_id}]: Request failed with {e.resp.status}, retrying in {delay:.2f}s "
+                                f"(attempt {attempt + 1}/{self.max_retries + 1})"
+                            )
+                            await asyncio.sleep(delay)
+                            continue
+                    
+                    if e.resp.status == 429:
+                        # Retries exhausted on a rate limit: count it towards opening the circuit
+                        self._circuit_breaker.record_failure()
+                        verdict_recorded = True
+                    
+                    logger.error(f"SheetsClient[{self._instance_id}]: Sheets API request failed: {e}")
+                    raise
                 
-                logger.error(f"SheetsClient[{self._instance_id}]: Sheets API request failed: {e}")
-                raise
+                except Exception as e:
+                    logger.error(f"SheetsClient[{self._instance_id}]: Unexpected error in Sheets API request: {e}")
+                    raise
             
-            except Exception as e:
-                logger.error(f"SheetsClient[{self._instance_id}]: Unexpected error in Sheets API request: {e}")
-                raise
-        
-        raise RuntimeError(f"Request failed after {self.max_retries + 1} attempts")
+            raise RuntimeError(f"Request failed after {self.max_retries + 1} attempts")
+        finally:
+            # A trial that ends any other way (other errors, cancellation) frees the slot for the next one
+            if is_trial and not verdict_recorded:
+                self._circuit_breaker.release_trial()
     
     async def get_sheet_values(
         self, 
@@ -304,6 +324,33 @@ class SheetsClient:
         logger.info(f"Built header index with {len([v for v in header_map.values() if v is not None])} mapped columns")
         return header_map
     
+    def _map_header_columns(self, headers: List[Any]) -> Dict[str, Optional[int]]:
+        """
+        Map expected column keys to 0-based indices within a header row.
+        
+        Args:
+            headers: Header row cell values
+            
+        Returns:
+            Dictionary mapping expected column keys to column indices (None if missing)
+        """
+        # Create mapping from actual column names to indices
+        name_to_index = {str(header).strip(): idx for idx, header in enumerate(headers) if header}
+        
+        logger.info(f"SheetsClient[{self._instance_id}]: Found headers: {list(name_to_index.keys())}")
+        
+        # Map expected keys to column indices based on config
+        mapping = {}
+        for key, column_name in HEADER_COLUMNS.items():
+            if column_name in name_to_index:
+                mapping[key] = name_to_index[column_name]
+                logger.info(f"SheetsClient[{self._instance_id}]: Mapped '{key}' -> '{column_name}' (index {name_to_index[column_name]})")
+            else:
+                logger.warning(f"SheetsClient[{self._instance_id}]: Column '{column_name}' not found in headers for key '{key}'")
+                mapping[key] = None
+        
+        return mapping
+    
     async def get_header_mapping(self, spreadsheet_id: str, sheet_name: str, header_row: int, max_retries: int = 3) -> Dict[str, int]:
         """
         Get column header mapping for a spreadsheet (with caching).
@@ -326,6 +373,7 @@ class SheetsClient:
         
         self._initialize_service()
         
+        prev_sleep = self.base_delay
         for attempt in range(max_retries + 1):
             try:
                 # Get header row using the thread pool
@@ -342,32 +390,7 @@ class SheetsClient:
                     logger.warning(f"SheetsClient[{self._instance_id}]: No header data found in {range_name}")
                     return {}
                 
-                # Create mapping from actual column names to indices
-                headers = values[0]
-                name_to_index = {str(header).strip(): idx for idx, header in enumerate(headers) if header}
-                
-                logger.info(f"SheetsClient[{self._instance_id}]: Found headers: {list(name_to_index.keys())}")
-                
-                # Map expected keys to column indices based on config
-                mapping = {}
-                column_mappings = {
-                    'admin': config.admin_column,
-                    'current_id': config.col_current_id,
-                    'business_use': config.col_business_use,
-                    'personal_use': config.col_personal_use,
-                    'personal_tax_cat': config.col_personal_tax_cat,
-                    'personal_percent_tax': config.col_personal_percent_tax,
-                    'business_tax_cat': config.col_business_tax_cat,
-                    'business_percent_tax': config.col_business_percent_tax
-                }
-                
-                for key, column_name in column_mappings.items():
-                    if column_name in name_to_index:
-                        mapping[key] = name_to_index[column_name]
-                        logger.info(f"SheetsClient[{self._instance_id}]: Mapped '{key}' -> '{column_name}' (index {name_to_index[column_name]})")
-                    else:
-                        logger.warning(f"SheetsClient[{self._instance_id}]: Column '{column_name}' not found in headers for key '{key}'")
-                        mapping[key] = None
+                mapping = self._map_header_columns(values[0])
                 
                 # Cache the mapping
                 self._header_mapping_cache[cache_key] = mapping
@@ -375,11 +398,13 @@ class SheetsClient:
                 
                 return mapping
                 
+            except CircuitOpenError:
+                raise
             except HttpError as e:
                 if e.resp.status == 429:  # Rate limit exceeded
                     if attempt < max_retries:
                         logger.warning(f"SheetsClient[{self._instance_id}]: Rate limit exceeded (429), using exponential backoff for retry {attempt + 1}")
-                        await self._exponential_backoff_sleep(attempt)
+                        prev_sleep = await self._exponential_backoff_sleep(prev_sleep)
                         continue
                     else:
                         logger.error(f"SheetsClient[{self._instance_id}]: Rate limit exceeded after {max_retries} retries")
@@ -408,6 +433,51 @@ class SheetsClient:
         
         return {}
     
+    async def get_header_mappings_batch(self, spreadsheet_id: str, ranges: List[Tuple[str, int]]) -> List[Dict[str, Optional[int]]]:
+        """
+        Get column header mappings for several tabs of a spreadsheet in one request.
+        
+        Uncached header rows are fetched with a single values().batchGet call, so N tabs
+        cost one round trip and one unit of read quota instead of N.
+        
+        Args:
+            spreadsheet_id: Google Sheets spreadsheet ID
+            ranges: (sheet_name, header_row) pairs, header_row being 1-based
+            
+        Returns:
+            Header mappings in the same order as ranges ({} where no header data was found)
+        """
+        cache_keys = [f"{spreadsheet_id}:{sheet_name}:{header_row}" for sheet_name, header_row in ranges]
+        missing = [
+            (cache_key, f"{sheet_name}!{header_row}:{header_row}")
+            for cache_key, (sheet_name, header_row) in zip(cache_keys, ranges)
+            if cache_key not in self._header_mapping_cache
+        ]
+        
+        if missing:
+            self._initialize_service()
+            
+            result = await self._execute_with_retry(
+                self.service.spreadsheets().values().batchGet,
+                spreadsheetId=spreadsheet_id,
+                ranges=[range_name for _, range_name in missing],
+                valueRenderOption='UNFORMATTED_VALUE'
+            )
+            
+            # valueRanges are returned in request order
+            value_ranges = result.get('valueRanges', [])
+            for (cache_key, range_name), value_range in zip(missing, value_ranges):
+                values = value_range.get('values', [])
+                if not values or not values[0]:
+                    logger.warning(f"SheetsClient[{self._instance_id}]: No header data found in {range_name}")
+                    continue
+                
+                self._header_mapping_cache[cache_key] = self._map_header_columns(values[0])
+            
+            logger.info(f"SheetsClient[{self._instance_id}]: Fetched {len(missing)} header rows from {spreadsheet_id} in one batch request")
+        
+        return [self._header_mapping_cache.get(cache_key, {}) for cache_key in cache_keys]
+    
     async def get_sheet_data(self, spreadsheet_id: str, sheet_name: str, start_row: int, max_retries: int = 3) -> List[List[Any]]:
         """
         Get all data from a sheet starting from the specified row.
@@ -423,6 +493,7 @@ class SheetsClient:
         """
         self._initialize_service()
         
+        prev_sleep = self.base_delay
         for attempt in range(max_retries + 1):
             try:
                 # Get all data from start_row onwards using thread pool
@@ -439,11 +510,13 @@ class SheetsClient:
                 
                 return values
                 
+            except CircuitOpenError:
+                raise
             except HttpError as e:
                 if e.resp.status == 429:  # Rate limit exceeded
                     if attempt < max_retries:
                         logger.warning(f"SheetsClient[{self._instance_id}]: Rate limit exceeded (429), using exponential backoff for retry {attempt + 1}")
-                        await self._exponential_backoff_sleep(attempt)
+                        prev_sleep = await self._exponential_backoff_sleep(prev_sleep)
                         continue
                     else:
                         logger.error(f"SheetsClient[{self._instance_id}]: Rate limit exceeded after {max_retries} retries")
@@ -477,22 +550,29 @@ class SheetsClient:
         self._header_mapping_cache.clear()
         logger.info("Header mapping cache cleared")
     
-    async def _exponential_backoff_sleep(self, attempt: int, max_backoff: float = 32.0):
+    def _decorrelated_jitter(self, prev_sleep: float, max_backoff: float = 32.0) -> float:
+        """Next backoff wait: drawn from [base_delay, prev_sleep * 3], capped at max_backoff."""
+        return min(max_backoff, random.uniform(self.base_delay, prev_sleep * 3))
+    
+    async def _exponential_backoff_sleep(self, prev_sleep: float, max_backoff: float = 32.0) -> float:
         """
-        Implement Google's recommended exponential backoff with jitter.
+        Back off after a rate-limit error using decorrelated jitter.
         
-        Based on: https://developers.google.com/workspace/sheets/api/limits#resolve_time-based_quota_errors
-        """
-        import random
+        Each wait is drawn from [base_delay, prev_sleep * 3] and capped at max_backoff, so
+        concurrent clients that hit a 429 together spread out instead of retrying in lockstep.
         
-        # Calculate base delay: (2^n) + random_number_milliseconds
-        base_delay = (2 ** attempt)
-        random_jitter = random.uniform(0, 1.0)  # Random number up to 1 second
+        Based on: https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
         
-        # Apply maximum backoff limit
-        wait_time = min(base_delay + random_jitter, max_backoff)
+        Args:
+            prev_sleep: Previous wait in seconds (pass base_delay before the first retry)
+            max_backoff: Maximum wait in seconds
+            
+        Returns:
+            The wait applied, to be passed as prev_sleep on the next retry
+        """
+        wait_time = self._decorrelated_jitter(prev_sleep, max_backoff)
         
-        logger.info(f"SheetsClient[{self._instance_id}]: Exponential backoff - waiting {wait_time:.2f}s (attempt {attempt + 1})")
+        logger.info(f"SheetsClient[{self._instance_id}]: Exponential backoff - waiting {wait_time:.2f}s")
         await asyncio.sleep(wait_time)
         
-        return wait_time 
\ No newline at end of file
+        return wait_time
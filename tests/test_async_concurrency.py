@@ -16,6 +16,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@pytest.mark.slow
 @pytest.mark.asyncio
 async def test_concurrent_processing_timing():
     """Test that concurrent processing actually runs in parallel."""
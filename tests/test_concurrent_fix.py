@@ -15,6 +15,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@pytest.mark.slow
 @pytest.mark.asyncio
 async def test_thread_pool_enables_true_concurrency():
     """Test that the thread pool executor enables true concurrent processing."""
@@ -1,35 +1,14 @@
 """Tests for multi-geocode record processing functionality."""
 
 import pytest
-from unittest.mock import Mock, patch
+from collections import Counter
+from types import SimpleNamespace
 from src.models import LookupTables, Record, CustomerType, GroupType, ProviderType, TransactionType, TaxType, PerTaxableType
 from src.mapper import RowMapper
-from src.config import Config
 
 
-class TestMultiGeocodeProcessing:
-    """Test end-to-end record generation for city files with multiple geocodes."""
-    
-    @pytest.fixture
-    def mock_config(self):
-        """Mock configuration object."""
-        config = Mock(spec=Config)
-        config.admin_filter_value = "Tag Level"
-        config.effective_date = "1999-01-01"
-        config.header_row = 4
-        config.sheet_name = "Research"
-        return config
-    
-    @pytest.fixture
-    def mock_s3_client(self):
-        """Mock S3 client for testing."""
-        mock_client = Mock()
-        return mock_client
-    
-    @pytest.fixture
-    def mock_geo_csv_content(self):
-        """Mock geo_state.csv content with multiple geocodes per city."""
-        return '''geocode,state,county,city,tax_district,jurisdiction
+# Mock geo_state.csv content with multiple geocodes per city
+_GEO_CSV_BYTES = b'''geocode,state,county,city,tax_district,jurisdiction
 US1700000000,IL,,,,STATE
 US0800000000,CO,,,,STATE
 US08013A0025,CO,BOULDER,BOULDER,,CITY
@@ -37,11 +16,9 @@ US08031A0002,CO,DENVER,DENVER,,CITY
 US17031A0003,IL,COOK,CHICAGO,,CITY
 US17031A0047,IL,COOK,CHICAGO,,CITY
 US17043A0053,IL,DUPAGE,CHICAGO,,CITY'''
-    
-    @pytest.fixture
-    def mock_tax_type_csv_content(self):
-        """Mock unique_tax_type.csv content."""
-        return '''geocode,tax_cat,tax_type
+
+# Mock unique_tax_type.csv content
+_TAX_TYPE_CSV_BYTES = b'''geocode,tax_cat,tax_type
 US1700000000,01,01
 US1700000000,01,02
 US0800000000,01,01
@@ -50,42 +27,86 @@ US08013A0025,01,01
 US17031A0003,01,47
 US17031A0047,01,47
 US17043A0053,01,47'''
-    
-    @pytest.fixture  
-    def mock_tax_cat_csv_content(self):
-        """Mock tax_cat.csv content."""
-        return '''tax_cat,tax_cat_desc
+
+# Mock tax_cat.csv content
+_TAX_CAT_CSV_BYTES = b'''tax_cat,tax_cat_desc
 01,General Sales Tax'''
-    
-    @pytest.fixture
-    def lookup_tables(self, mock_s3_client, mock_geo_csv_content, mock_tax_type_csv_content, mock_tax_cat_csv_content):
-        """Create LookupTables instance with mocked S3 data."""
-        def mock_get_object(Bucket, Key):
-            mock_response = {'Body': Mock()}
-            if Key == "mapping/geo_state.csv":
-                mock_response['Body'].read.return_value = mock_geo_csv_content.encode('utf-8')
-            elif Key == "mapping/unique_tax_type.csv":
-                mock_response['Body'].read.return_value = mock_tax_type_csv_content.encode('utf-8')
-            elif Key == "mapping/tax_cat.csv":
-                mock_response['Body'].read.return_value = mock_tax_cat_csv_content.encode('utf-8')
-            else:
-                raise Exception(f"Unexpected S3 key: {Key}")
-            return mock_response
-        
-        with patch('src.models.boto3.client', return_value=mock_s3_client):
-            mock_s3_client.get_object.side_effect = mock_get_object
-            
-            lookup_tables = LookupTables("test-bucket")
-            # Trigger loading of all lookup data
-            _ = lookup_tables.geocode_lookup
-            _ = lookup_tables.tax_type_lookup  
-            _ = lookup_tables.tax_cat_lookup
-            return lookup_tables
-    
-    @pytest.fixture
-    def row_mapper(self, lookup_tables):
-        """Create RowMapper instance."""
-        return RowMapper(lookup_tables)
+
+# Cell values repeated across the sample rows, shared as single objects
+_TAXABLE = "Taxable"
+_GENERAL_SALES_TAX = "General Sales Tax"
+_PERCENT_8_75 = "8.75%"
+_TAG_LEVEL = "Tag Level"
+
+
+def _make_response(body):
+    """Build a get_object-shaped response whose Body.read() returns body."""
+    return {'Body': SimpleNamespace(read=lambda _body=body: _body)}
+
+
+# Prebuilt get_object responses served by the stub client, keyed by S3 key
+_RESPONSES = {
+    "mapping/geo_state.csv": _make_response(_GEO_CSV_BYTES),
+    "mapping/unique_tax_type.csv": _make_response(_TAX_TYPE_CSV_BYTES),
+    "mapping/tax_cat.csv": _make_response(_TAX_CAT_CSV_BYTES),
+}
+
+
+def _stub_get_object(Bucket, Key):
+    """Serve lookup CSVs from _RESPONSES; unknown keys raise KeyError."""
+    return _RESPONSES[Key]
+
+
+def _summary(records):
+    """Collect the distinct geocodes, customers, tax types and items of records in one pass."""
+    geocodes, customers, tax_types, items = set(), set(), set(), set()
+    for record in records:
+        geocodes.add(record.geocode)
+        customers.add(record.customer)
+        tax_types.add(record.tax_type)
+        items.add(record.item)
+    return SimpleNamespace(geocodes=geocodes, customers=customers, tax_types=tax_types, items=items)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _stub_s3():
+    """Route src.models.boto3.client to a single stub S3 client for this module."""
+    stub_client = SimpleNamespace(get_object=_stub_get_object)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr('src.models.boto3.client', lambda *args, **kwargs: stub_client)
+        yield stub_client
+
+
+@pytest.fixture(scope="module")
+def mock_config():
+    """Lightweight stand-in for Config (tests only read these attributes)."""
+    return SimpleNamespace(
+        admin_filter_value="Tag Level",
+        effective_date="1999-01-01",
+        header_row=4,
+        sheet_name="Research",
+    )
+
+
+@pytest.fixture(scope="module")
+def lookup_tables(_stub_s3):
+    """Create LookupTables instance backed by the stubbed S3 client."""
+    lookup_tables = LookupTables("test-bucket")
+    # Trigger loading of all lookup data
+    _ = lookup_tables.geocode_lookup
+    _ = lookup_tables.tax_type_lookup
+    _ = lookup_tables.tax_cat_lookup
+    return lookup_tables
+
+
+@pytest.fixture(scope="module")
+def row_mapper(lookup_tables):
+    """Create RowMapper instance."""
+    return RowMapper(lookup_tables)
+
+
+class TestMultiGeocodeProcessing:
+    """Test end-to-end record generation for city files with multiple geocodes."""
     
     @pytest.fixture
     def sample_header_map(self):
@@ -110,95 +131,50 @@ US17043A0053,01,47'''
             "1.1.1.4.3.0.0.0",  # Column B - Current ID
             "L1 Description",  # Column C
             "L2 Description",  # Column D  
-            "Taxable",  # Column E - Business Use
-            "General Sales Tax",  # Column F - Business tax_cat
-            "8.75%",  # Column G - Business percent_taxable
-            "Taxable",  # Column H - Personal Use
-            "General Sales Tax",  # Column I - Personal tax_cat
-            "8.75%",  # Column J - Personal percent_taxable
-            "Tag Level"  # Column K - Admin (matches filter)
+            _TAXABLE,  # Column E - Business Use
+            _GENERAL_SALES_TAX,  # Column F - Business tax_cat
+            _PERCENT_8_75,  # Column G - Business percent_taxable
+            _TAXABLE,  # Column H - Personal Use
+            _GENERAL_SALES_TAX,  # Column I - Personal tax_cat
+            _PERCENT_8_75,  # Column J - Personal percent_taxable
+            _TAG_LEVEL  # Column K - Admin (matches filter)
         ]
     
-    def test_state_file_processing(self, row_mapper, sample_header_map, sample_row_data, mock_config):
-        """Test processing state-level file returns single geocode records."""
-        # State file should return single geocode
-        rows = [sample_row_data]
-        records, error, processing_errors = row_mapper.process_sheet_rows(
-            rows, sample_header_map, "Illinois Sales Tax Research", mock_config
-        )
-        
-        assert error is None
-        assert len(records) > 0
-        
-        # All records should have the same state geocode
-        state_geocode = "US1700000000"
-        assert all(record.geocode == state_geocode for record in records)
-        
-        # Should have business and personal records (or just personal if identical treatment)
-        unique_customers = {record.customer for record in records}
-        assert CustomerType.PERSONAL.value in unique_customers  # "99" should always be present
-    
-    def test_city_file_single_geocode(self, row_mapper, sample_header_map, sample_row_data, mock_config):
-        """Test processing city file with single geocode."""
+    @pytest.mark.parametrize("filename, expected_geocodes, expected_tax_types, expected_count", [
+        # State file: single state geocode, 2 tax types for tax_cat "01"
+        ("Illinois Sales Tax Research", {"US1700000000"}, {"01", "02"}, 2),
         # Boulder has only one geocode
-        rows = [sample_row_data]
-        records, error, processing_errors = row_mapper.process_sheet_rows(
-            rows, sample_header_map, "Boulder Sales Tax Research", mock_config
-        )
-        
-        assert error is None
-        assert len(records) > 0
-        
-        # All records should have Boulder's geocode
-        boulder_geocode = "US08013A0025"
-        assert all(record.geocode == boulder_geocode for record in records)
-    
-    def test_city_file_multiple_geocodes(self, row_mapper, sample_header_map, sample_row_data, mock_config):
-        """Test processing city file with multiple geocodes."""
-        # Chicago has 3 geocodes
-        rows = [sample_row_data]
-        records, error, processing_errors = row_mapper.process_sheet_rows(
-            rows, sample_header_map, "Chicago Sales Tax Research", mock_config
-        )
-        
-        assert error is None
-        assert len(records) > 0
-        
-        # Records should be spread across Chicago's 3 geocodes
-        chicago_geocodes = {"US17031A0003", "US17031A0047", "US17043A0053"}
-        record_geocodes = {record.geocode for record in records}
-        assert record_geocodes == chicago_geocodes
-        
-        # Each geocode should have the same number of records (since same row data)
-        geocode_counts = {}
-        for record in records:
-            geocode_counts[record.geocode] = geocode_counts.get(record.geocode, 0) + 1
-        
-        # All geocodes should have same count (same source data processed for each)
-        counts = list(geocode_counts.values())
-        assert all(count == counts[0] for count in counts)
-    
-    def test_record_multiplication_calculation(self, row_mapper, sample_header_map, sample_row_data, mock_config):
-        """Test that record count scales correctly with geocodes and tax types."""
+        ("Boulder Sales Tax Research", {"US08013A0025"}, {"01"}, 1),
         # Chicago: 3 geocodes, each geocode has 1 tax_type (47) for tax_cat "01"
+        ("Chicago Sales Tax Research", {"US17031A0003", "US17031A0047", "US17043A0053"}, {"47"}, 3),
+    ])
+    def test_geocode_and_tax_type_expansion(self, row_mapper, sample_header_map, sample_row_data, mock_config,
+                                            filename, expected_geocodes, expected_tax_types, expected_count):
+        """Test that record count scales correctly with geocodes and tax types."""
         # Row creates 1 record template (business and personal identical → collapsed to personal "99")
-        # Expected: 1 record template × 3 geocodes × 1 tax_type each = 3 records
-        
+        # Expected: 1 record template × geocodes × tax_types per geocode
         rows = [sample_row_data]
         records, error, processing_errors = row_mapper.process_sheet_rows(
-            rows, sample_header_map, "Chicago Sales Tax Research", mock_config
+            rows, sample_header_map, filename, mock_config
         )
         
         assert error is None
+        assert len(records) == expected_count
         
-        # Should have 3 records (1 per geocode, 1 tax_type each)
-        assert len(records) == 3
+        summary = _summary(records)
         
-        # All records should have tax_type "47" (Chicago-specific)
-        assert all(record.tax_type == "47" for record in records)
+        # Records should be spread across exactly the jurisdiction's geocodes
+        assert summary.geocodes == expected_geocodes
+        
+        # Tax types come from the geocode+tax_cat lookup
+        assert summary.tax_types == expected_tax_types
         
         # All records should be customer "99" (collapsed due to identical treatment)
-        assert all(record.customer == CustomerType.PERSONAL.value for record in records)
+        assert summary.customers == {CustomerType.PERSONAL.value}
+        
+        # Each geocode should have the same number of records (since same row data)
+        geocode_counts = Counter(record.geocode for record in records)
+        assert len(set(geocode_counts.values())) == 1
     
     def test_different_tax_treatment_multiplication(self, row_mapper, sample_header_map, mock_config):
         """Test record multiplication when business and personal have different treatment."""
@@ -208,13 +184,13 @@ US17043A0053,01,47'''
             "1.1.1.4.3.0.0.0",  # Column B - Current ID
             "L1 Description",  # Column C
             "L2 Description",  # Column D  
-            "Taxable",  # Column E - Business Use
-            "General Sales Tax",  # Column F - Business tax_cat
+            _TAXABLE,  # Column E - Business Use
+            _GENERAL_SALES_TAX,  # Column F - Business tax_cat
             "10.0%",  # Column G - Business percent_taxable (DIFFERENT)
-            "Taxable",  # Column H - Personal Use
-            "General Sales Tax",  # Column I - Personal tax_cat
-            "8.75%",  # Column J - Personal percent_taxable (DIFFERENT)
-            "Tag Level"  # Column K - Admin (matches filter)
+            _TAXABLE,  # Column H - Personal Use
+            _GENERAL_SALES_TAX,  # Column I - Personal tax_cat
+            _PERCENT_8_75,  # Column J - Personal percent_taxable (DIFFERENT)
+            _TAG_LEVEL  # Column K - Admin (matches filter)
         ]
         
         rows = [different_treatment_row]
@@ -228,16 +204,13 @@ US17043A0053,01,47'''
         assert len(records) == 6
         
         # Should have both business and personal customer types
-        customer_types = {record.customer for record in records}
+        customer_types = _summary(records).customers
         assert CustomerType.BUSINESS.value in customer_types  # "0B"
         assert CustomerType.PERSONAL.value in customer_types  # "99"
         
         # Each geocode should have 2 records (business + personal)
-        geocode_counts = {}
-        for record in records:
-            geocode_counts[record.geocode] = geocode_counts.get(record.geocode, 0) + 1
-        
-        assert all(count == 2 for count in geocode_counts.values())
+        geocode_counts = Counter(record.geocode for record in records)
+        assert set(geocode_counts.values()) == {2}
     
     def test_tax_type_no_fallback_exclusion(self, row_mapper, sample_header_map, sample_row_data, mock_config):
         """Test that records are excluded when city has no direct tax types (no fallback)."""
@@ -274,13 +247,13 @@ US17043A0053,01,47'''
             "1.1.1.4.3.0.0.0",  # Column B - Current ID
             "L1 Description",  # Column C
             "L2 Description",  # Column D  
-            "Taxable",  # Column E - Business Use
+            _TAXABLE,  # Column E - Business Use
             "Unknown Tax Cat",  # Column F - Business tax_cat (no match)
-            "8.75%",  # Column G - Business percent_taxable
-            "Taxable",  # Column H - Personal Use
+            _PERCENT_8_75,  # Column G - Business percent_taxable
+            _TAXABLE,  # Column H - Personal Use
             "Unknown Tax Cat",  # Column I - Personal tax_cat (no match)
-            "8.75%",  # Column J - Personal percent_taxable
-            "Tag Level"  # Column K - Admin (matches filter)
+            _PERCENT_8_75,  # Column J - Personal percent_taxable
+            _TAG_LEVEL  # Column K - Admin (matches filter)
         ]
         
         rows = [no_tax_type_row]
@@ -297,18 +270,18 @@ US17043A0053,01,47'''
         rows = [
             # Row 1: Matches admin filter
             [
-                "", "1.1.1.0.0.0.0.0", "L1", "L2", "Taxable", "General Sales Tax", "8.75%",
-                "Taxable", "General Sales Tax", "8.75%", "Tag Level"
+                "", "1.1.1.0.0.0.0.0", "L1", "L2", _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75,
+                _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75, _TAG_LEVEL
             ],
             # Row 2: Doesn't match admin filter (should be skipped)
             [
-                "", "1.1.2.0.0.0.0.0", "L1", "L2", "Taxable", "General Sales Tax", "8.75%",
-                "Taxable", "General Sales Tax", "8.75%", "Other Value"
+                "", "1.1.2.0.0.0.0.0", "L1", "L2", _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75,
+                _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75, "Other Value"
             ],
             # Row 3: Matches admin filter
             [
-                "", "1.1.3.0.0.0.0.0", "L1", "L2", "Taxable", "General Sales Tax", "8.75%",
-                "Taxable", "General Sales Tax", "8.75%", "Tag Level"
+                "", "1.1.3.0.0.0.0.0", "L1", "L2", _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75,
+                _TAXABLE, _GENERAL_SALES_TAX, _PERCENT_8_75, _TAG_LEVEL
             ]
         ]
         
@@ -323,7 +296,7 @@ US17043A0053,01,47'''
         assert len(records) == 6
         
         # Check that we have the expected item IDs
-        item_ids = {record.item for record in records}
+        item_ids = _summary(records).items
         assert "1.1.1.0.0.0.0.0" in item_ids
         assert "1.1.3.0.0.0.0.0" in item_ids  
         assert "1.1.2.0.0.0.0.0" not in item_ids  # Should be excluded
@@ -344,7 +317,7 @@ US17043A0053,01,47'''
         assert record.tax_auth_id == ""
         assert record.group == GroupType.DEFAULT.value  # "7777"
         assert record.item == "1.1.1.4.3.0.0.0"
-        assert record.customer in [CustomerType.BUSINESS.value, CustomerType.PERSONAL.value]
+        assert _summary(records).customers <= {CustomerType.BUSINESS.value, CustomerType.PERSONAL.value}
         assert record.provider == ProviderType.DEFAULT.value  # "99"
         assert record.transaction == TransactionType.DEFAULT.value  # "01"
         assert record.taxable in [0, 1]  # Valid taxable values
@@ -157,16 +157,30 @@ incomplete'''
     def test_get_unmapped_ids(self, mapper):
         """Test retrieval of unmapped research IDs."""
         # Add some unmapped IDs
-        mapper.unmapped_ids.add("1.1.1.4.9")
-        mapper.unmapped_ids.add("2.2.2.2.2")
-        mapper.unmapped_ids.add("unknown.id")
+        mapper._track_unmapped("1.1.1.4.9")
+        mapper._track_unmapped("2.2.2.2.2")
+        mapper._track_unmapped("unknown.id")
         
         unmapped_list = mapper.get_unmapped_ids()
         
         # Should be sorted and contain all unmapped IDs
         assert len(unmapped_list) == 3
         assert unmapped_list == sorted(["1.1.1.4.9", "2.2.2.2.2", "unknown.id"])
-    
+
+    def test_get_unmapped_ids_reflects_new_ids(self, mapper):
+        """Test sorted unmapped IDs stay current across repeated calls."""
+        mapper.convert_research_id("2.2.2.2.2")
+        assert mapper.get_unmapped_ids() == ["2.2.2.2.2"]
+
+        # New unmapped IDs after a call must show up, in sorted order
+        mapper.convert_research_id("1.1.1.4.9")
+        mapper.convert_research_id("2.2.2.2.2")  # Duplicate, tracked once
+        assert mapper.get_unmapped_ids() == ["1.1.1.4.9", "2.2.2.2.2"]
+
+        # Returned list is a copy; mutating it does not affect the mapper
+        mapper.get_unmapped_ids().append("tampered")
+        assert mapper.get_unmapped_ids() == ["1.1.1.4.9", "2.2.2.2.2"]
+
     def test_get_mapping_stats(self, mapper):
         """Test mapping statistics."""
         # Set up test data
@@ -174,7 +188,7 @@ incomplete'''
             "1.1.1.4.3": "022",
             "1.1.2.1.1": "123"
         }
-        mapper.unmapped_ids.add("unknown.id")
+        mapper._track_unmapped("unknown.id")
         
         stats = mapper.get_mapping_stats()
         
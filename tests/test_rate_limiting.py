@@ -1,14 +1,23 @@
-"""Test rate limiting and 429 error handling."""
+"""Test rate limiting and 429 error handling.
+
+Backoff is validated on a virtual clock: asyncio.sleep is replaced with an
+AsyncMock and the requested delays are read back from await_args_list, so
+no test waits in real time.
+"""
 
 import asyncio
-import time
 import logging
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 import pytest
+from types import SimpleNamespace
 from googleapiclient.errors import HttpError
 
 from src.sheets_client import SheetsClient
 from src.drive_client import DriveClient
+from src.rate_limiter import TokenBucket
+from src.resilience import CircuitBreaker, CircuitOpenError
+
+pytestmark = pytest.mark.fast
 
 # Configure logging for tests
 logging.basicConfig(level=logging.INFO)
@@ -25,83 +34,144 @@ def create_mock_429_error():
     return error
 
 
+def awaited_delays(sleep_mock):
+    """Return the delays passed to a patched asyncio.sleep, in call order."""
+    return [call.args[0] for call in sleep_mock.await_args_list]
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breaker(monkeypatch):
+    """Give each test its own closed circuit breaker (the real one is shared class state)."""
+    monkeypatch.setattr(SheetsClient, '_circuit_breaker', CircuitBreaker(failure_threshold=5, reset_timeout=60.0))
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_bucket(monkeypatch):
+    """Give each test its own full token bucket; with asyncio.sleep patched the shared one only runs up debt."""
+    shared = SheetsClient._token_bucket
+    monkeypatch.setattr(SheetsClient, '_token_bucket', TokenBucket(capacity=shared.capacity, refill_rate=shared.refill_rate))
+
+
+class VirtualClock:
+    """Clock for TokenBucket whose sleep advances time instantly."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def time(self):
+        return self.now
+    
+    async def sleep(self, delay):
+        self.now += delay
+
+
+@pytest.fixture
+def mocked_sheets_client(request):
+    """
+    SheetsClient with values().get() wired to a mock request, yielding (client, mock_request).
+    
+    Parametrize indirectly with (max_retries, execute_side_effect).
+    """
+    max_retries, side_effect = request.param
+    client = SheetsClient(max_retries=max_retries)
+    
+    mock_service = MagicMock()
+    client.service = mock_service
+    
+    mock_request = MagicMock()
+    mock_service.spreadsheets().values().get.return_value = mock_request
+    mock_request.execute.side_effect = side_effect
+    
+    with patch.object(client, '_initialize_service'):
+        yield client, mock_request
+
+
+HEADER_VALUES = {'values': [['Admin', 'Current ID', 'Business Use']]}
+
+
 @pytest.mark.asyncio
-async def test_sheets_client_429_handling():
-    """Test that SheetsClient handles 429 errors with exponential backoff."""
+@pytest.mark.parametrize("mocked_sheets_client, expected_calls, expect_error", [
+    # First two calls raise 429, third succeeds: initial + 2 retries
+    pytest.param((3, [create_mock_429_error(), create_mock_429_error(), HEADER_VALUES]), 3, False, id="recovers"),
+    # Every call raises 429: get_header_mapping's 4 attempts x _execute_with_retry's 3 attempts
+    pytest.param((2, create_mock_429_error()), 12, True, id="exhausted"),
+], indirect=["mocked_sheets_client"])
+async def test_sheets_client_429_handling(mocked_sheets_client, expected_calls, expect_error):
+    """Test that SheetsClient backs off on 429 errors and gives up after max retries."""
     
-    client = SheetsClient(max_retries=3)
+    client, mock_request = mocked_sheets_client
     
-    # Mock the entire service initialization
-    with patch.object(client, '_initialize_service') as mock_init:
-        # Create a mock service
-        mock_service = MagicMock()
-        client.service = mock_service
-        
-        # Mock the request chain
-        mock_request = MagicMock()
-        mock_service.spreadsheets().values().get.return_value = mock_request
-        
-        # First two calls raise 429, third succeeds
-        mock_request.execute.side_effect = [
-            create_mock_429_error(),  # First attempt: 429
-            create_mock_429_error(),  # Second attempt: 429
-            {'values': [['Admin', 'Current ID', 'Business Use']]}  # Third attempt: success
-        ]
-        
-        # Track timing
-        start_time = time.time()
-        
-        # This should succeed after 2 retries
-        result = await client.get_header_mapping('test_sheet_id', 'Sheet1', 1)
-        
-        total_time = time.time() - start_time
-        
-        # Verify the result
-        assert result is not None
-        assert 'admin' in result  # Should have mapped admin column
-        
-        # Verify exponential backoff timing
-        # First retry: ~1s, Second retry: ~2s = ~3s total minimum
-        assert total_time >= 3.0, f"Expected at least 3s for exponential backoff, got {total_time:.2f}s"
-        assert total_time < 10.0, f"Backoff took too long: {total_time:.2f}s"
-        
-        # Verify execute was called 3 times (initial + 2 retries)
-        assert mock_request.execute.call_count == 3
-        
-        logger.info(f"✅ 429 handling test passed - total time: {total_time:.2f}s")
+    with patch('src.sheets_client.asyncio.sleep', new=AsyncMock()) as sleep_mock:
+        if expect_error:
+            with pytest.raises(HttpError) as exc_info:
+                await client.get_header_mapping('test_sheet_id', 'Sheet1', 1)
+            assert exc_info.value.resp.status == 429
+        else:
+            result = await client.get_header_mapping('test_sheet_id', 'Sheet1', 1)
+            assert 'admin' in result  # Should have mapped admin column
+    
+    # Verify decorrelated jitter: every wait in [base, 32s], and each chain starts in [base, 3 * base]
+    delays = awaited_delays(sleep_mock)
+    assert delays, "Expected backoff sleeps after 429 responses"
+    assert all(client.base_delay <= d <= 32.0 for d in delays), f"Backoff outside [base, 32s]: {delays}"
+    assert delays[0] <= client.base_delay * 3, f"First backoff above 3x base: {delays}"
+    if not expect_error:
+        # Single retry chain: each wait at most 3x the previous one
+        assert len(delays) == 2 and delays[1] <= delays[0] * 3, f"Backoff chain out of range: {delays}"
+    
+    assert mock_request.execute.call_count == expected_calls
+    
+    logger.info(f"✅ 429 handling test passed - requested sleeps: {delays}")
 
 
 @pytest.mark.asyncio
-async def test_sheets_client_429_exhaustion():
-    """Test that SheetsClient eventually gives up after max retries."""
+async def test_sheets_client_batch_header_mappings():
+    """Test that header mappings for several tabs come from one batchGet, retried on 429."""
     
-    client = SheetsClient(max_retries=2)  # Only 2 retries
+    client = SheetsClient(max_retries=3)
     
-    # Mock the entire service initialization
     with patch.object(client, '_initialize_service') as mock_init:
-        # Create a mock service
         mock_service = MagicMock()
         client.service = mock_service
         
-        # Mock the request chain
         mock_request = MagicMock()
-        mock_service.spreadsheets().values().get.return_value = mock_request
+        mock_service.spreadsheets().values().batchGet.return_value = mock_request
         
-        # All calls raise 429
-        mock_request.execute.side_effect = create_mock_429_error()
+        # First call raises 429, second returns one valueRange per requested range
+        mock_request.execute.side_effect = [
+            create_mock_429_error(),
+            {'valueRanges': [
+                {'range': "'Sheet1'!A1:C1", 'values': [['Admin', 'Current ID', 'Business Use']]},
+                {'range': "'Sheet2'!A4:B4", 'values': [['Current ID', 'Admin']]},
+                {'range': "'Empty'!A2:A2"},
+            ]}
+        ]
         
-        # This should eventually raise the 429 error
-        with pytest.raises(HttpError) as exc_info:
-            await client.get_header_mapping('test_sheet_id', 'Sheet1', 1)
+        with patch('src.sheets_client.asyncio.sleep', new=AsyncMock()):
+            mappings = await client.get_header_mappings_batch(
+                'test_sheet_id', [('Sheet1', 1), ('Sheet2', 4), ('Empty', 2)]
+            )
         
-        # Verify it's a 429 error
-        assert exc_info.value.resp.status == 429
+        # One batchGet for all three ranges (plus the retry), no per-sheet values().get
+        mock_service.spreadsheets().values().batchGet.assert_called_with(
+            spreadsheetId='test_sheet_id',
+            ranges=['Sheet1!1:1', 'Sheet2!4:4', 'Empty!2:2'],
+            valueRenderOption='UNFORMATTED_VALUE'
+        )
+        assert mock_request.execute.call_count == 2
+        mock_service.spreadsheets().values().get.assert_not_called()
         
-        # The get_header_mapping method has its own retry logic (max_retries=3 by default)
-        # plus the _execute_with_retry logic, so expect more calls
-        assert mock_request.execute.call_count >= 3
+        # valueRanges are parsed positionally into per-tab mappings
+        assert len(mappings) == 3
+        assert mappings[0]['admin'] == 0 and mappings[0]['current_id'] == 1
+        assert mappings[1]['admin'] == 1 and mappings[1]['current_id'] == 0
+        assert mappings[2] == {}
         
-        logger.info("✅ 429 exhaustion test passed - correctly gave up after max retries")
+        # Cached tabs are served without another request
+        assert await client.get_header_mapping('test_sheet_id', 'Sheet2', 4) == mappings[1]
+        assert mock_request.execute.call_count == 2
+        
+        logger.info("✅ Batch header mapping test passed")
 
 
 @pytest.mark.asyncio
@@ -135,49 +205,223 @@ async def test_drive_client_429_handling():
             {'files': [{'id': 'test_file', 'name': 'Test File'}]}  # Second attempt: success
         ]
         
-        # Track timing
-        start_time = time.time()
-        
         # This should succeed after 1 retry
-        result = await client.list_files_in_folder('test_folder_id')
-        
-        total_time = time.time() - start_time
+        with patch('src.drive_client.asyncio.sleep', new=AsyncMock()) as sleep_mock:
+            result = await client.list_files_in_folder('test_folder_id')
         
         # Verify the result
         assert len(result) == 1
         assert result[0]['name'] == 'Test File'
         
-        # Verify exponential backoff timing (at least 1 second for first retry)
-        assert total_time >= 1.0, f"Expected at least 1s for exponential backoff, got {total_time:.2f}s"
+        # One jittered backoff in [1s, 3s]; the sub-50ms sleeps are global request pacing
+        delays = awaited_delays(sleep_mock)
+        backoffs = [d for d in delays if d >= 0.05]
+        assert len(backoffs) == 1 and 1.0 <= backoffs[0] <= 3.0, f"Expected one backoff in [1s, 3s], got {delays}"
         
-        logger.info(f"✅ DriveClient 429 handling test passed - total time: {total_time:.2f}s")
+        logger.info(f"✅ DriveClient 429 handling test passed - requested sleeps: {delays}")
 
 
 @pytest.mark.asyncio
 async def test_exponential_backoff_timing():
-    """Test that exponential backoff follows Google's recommended algorithm."""
+    """Test that backoff follows the decorrelated jitter schedule."""
     
-    client = SheetsClient()
+    client = SheetsClient(base_delay=1.0)
+    max_backoff = 32.0
     
-    # Test the exponential backoff method directly
-    timings = []
+    # Chain each returned wait into the next call, as the retry loops do
+    returned = []
+    prev_sleep = client.base_delay
+    with patch('src.sheets_client.asyncio.sleep', new=AsyncMock()) as sleep_mock:
+        for attempt in range(8):
+            prev_sleep = await client._exponential_backoff_sleep(prev_sleep, max_backoff=max_backoff)
+            returned.append(prev_sleep)
     
-    for attempt in range(4):
-        start = time.time()
-        await client._exponential_backoff_sleep(attempt, max_backoff=32.0)
-        elapsed = time.time() - start
-        timings.append(elapsed)
-        logger.info(f"Attempt {attempt}: waited {elapsed:.2f}s")
+    timings = awaited_delays(sleep_mock)
+    for attempt, delay in enumerate(timings):
+        logger.info(f"Attempt {attempt}: would wait {delay:.2f}s")
     
-    # Verify exponential growth with jitter
-    # Expected: ~1s, ~2s, ~4s, ~8s (plus random jitter up to 1s)
-    assert 1.0 <= timings[0] <= 3.0, f"First backoff should be 1-3s, got {timings[0]:.2f}s"
-    assert 2.0 <= timings[1] <= 4.0, f"Second backoff should be 2-4s, got {timings[1]:.2f}s"
-    assert 4.0 <= timings[2] <= 6.0, f"Third backoff should be 4-6s, got {timings[2]:.2f}s"
-    assert 8.0 <= timings[3] <= 10.0, f"Fourth backoff should be 8-10s, got {timings[3]:.2f}s"
+    # Each wait is drawn from [base, prev * 3] and capped
+    assert timings == returned
+    assert min(timings) >= client.base_delay, f"Backoff below base delay: {timings}"
+    assert max(timings) <= max_backoff, f"Backoff above cap: {timings}"
+    previous = client.base_delay
+    for delay in timings:
+        assert delay <= previous * 3, f"Backoff {delay:.2f}s exceeds 3x previous {previous:.2f}s"
+        previous = delay
     
     logger.info("✅ Exponential backoff timing test passed")
 
 
+@pytest.mark.asyncio
+async def test_token_bucket_burst_then_refill():
+    """Test that the bucket serves a full burst immediately, then one token per refill interval."""
+    
+    clock = VirtualClock()
+    bucket = TokenBucket(capacity=60, refill_rate=1.0, clock=clock.time)
+    
+    with patch('src.rate_limiter.asyncio.sleep', new=clock.sleep):
+        for _ in range(60):
+            await bucket.acquire()
+        assert clock.now == 0.0, "Burst up to capacity should not wait"
+        
+        for _ in range(60):
+            await bucket.acquire()
+    
+    # 60 tokens beyond capacity at 1 token/second
+    assert clock.now == pytest.approx(60.0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mocked_sheets_client", [(3, None)], indirect=True)
+async def test_sheets_client_token_bucket_prevents_429(mocked_sheets_client):
+    """Test that 120 rapid requests never exceed 60 API calls in any 60-second window."""
+    
+    client, mock_request = mocked_sheets_client
+    clock = VirtualClock()
+    call_times = []
+    
+    def execute():
+        call_times.append(clock.now)
+        return {'values': [['x']]}
+    
+    mock_request.execute.side_effect = execute
+    # Same sizing as the shared bucket, on the virtual clock
+    client._token_bucket = TokenBucket(
+        capacity=SheetsClient._token_bucket.capacity,
+        refill_rate=SheetsClient._token_bucket.refill_rate,
+        clock=clock.time
+    )
+    
+    with patch('src.rate_limiter.asyncio.sleep', new=clock.sleep):
+        for i in range(120):
+            await client.get_sheet_values('test_sheet_id', f'Sheet1!{i + 1}:{i + 1}')
+    
+    # Every request succeeded first time; pacing came from the bucket, not backoff
+    assert len(call_times) == 120
+    
+    # Sliding 60s window starting at each call must stay within the 60 requests/minute quota
+    busiest = max(
+        sum(1 for t in call_times[i:] if t - start < 60.0)
+        for i, start in enumerate(call_times)
+    )
+    assert busiest <= 60, f"{busiest} requests in one 60s window exceeds the 60/minute quota"
+    
+    logger.info(f"✅ Token bucket test passed - 120 requests paced over {clock.now:.1f}s virtual, "
+                f"at most {busiest} per 60s window")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mocked_sheets_client", [(0, create_mock_429_error())], indirect=True)
+async def test_sheets_client_circuit_breaker_fails_fast(mocked_sheets_client):
+    """Test that after 5 rate-limited requests the breaker rejects further requests without calling the API."""
+    
+    client, mock_request = mocked_sheets_client
+    
+    outcomes = []
+    with patch('src.sheets_client.asyncio.sleep', new=AsyncMock()):
+        for _ in range(10):
+            try:
+                await client._execute_with_retry(
+                    client.service.spreadsheets().values().get,
+                    spreadsheetId='test_sheet_id',
+                    range='Sheet1!1:1'
+                )
+            except (HttpError, CircuitOpenError) as e:
+                outcomes.append(type(e))
+    
+    # First 5 requests reach the API and fail with 429; the other 5 are rejected up front
+    assert outcomes == [HttpError] * 5 + [CircuitOpenError] * 5
+    assert mock_request.execute.call_count == 5
+    assert SheetsClient._circuit_breaker.state == CircuitBreaker.OPEN
+    
+    logger.info("✅ Circuit breaker test passed - 5 requests rejected without an API call")
+
+
+def test_circuit_breaker_half_open_recovery():
+    """Test that the breaker allows a trial after the reset timeout, closing on success and re-opening on failure."""
+    
+    clock = VirtualClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0, clock=clock.time)
+    
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+    
+    # Trial after timeout fails: open again for another full timeout
+    clock.now = 60.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    
+    # Trial after timeout succeeds: closed with the failure count reset
+    clock.now = 120.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_half_open_allows_single_trial():
+    """Test that half-open admits one trial request and rejects the rest until it completes."""
+    
+    clock = VirtualClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock.time)
+    breaker.record_failure()
+    
+    clock.now = 60.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    
+    # Failed trial re-opens; the next cooldown grants a fresh trial
+    breaker.record_failure()
+    assert not breaker.allow_request()
+    clock.now = 120.0
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    
+    # Trial ending in a non-rate-limit error frees the slot for another trial
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    
+    # Successful trial closes the circuit for everyone
+    breaker.record_success()
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mocked_sheets_client", [(0, None)], indirect=True)
+async def test_sheets_client_cancelled_trial_frees_half_open_slot(mocked_sheets_client, monkeypatch):
+    """Test that cancelling the half-open trial request lets the next request become the trial."""
+    
+    client, _ = mocked_sheets_client
+    clock = VirtualClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock.time)
+    monkeypatch.setattr(SheetsClient, '_circuit_breaker', breaker)
+    breaker.record_failure()
+    clock.now = 60.0
+    
+    # Trial request parks waiting for a token that never comes
+    client._token_bucket = SimpleNamespace(acquire=asyncio.Event().wait)
+    trial = asyncio.create_task(client._execute_with_retry(
+        client.service.spreadsheets().values().get,
+        spreadsheetId='test_sheet_id',
+        range='Sheet1!1:1'
+    ))
+    await asyncio.sleep(0)
+    assert not breaker.allow_request(), "Trial should hold the half-open slot while in flight"
+    
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "-s"]) 
\ No newline at end of file
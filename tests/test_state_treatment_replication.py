@@ -1,22 +1,21 @@
 """Tests for state-level tax treatment replication functionality."""
 
+import dataclasses
 import pytest
-from unittest.mock import Mock, patch
-from src.models import Record, LookupTables, GroupType, CustomerType, ProviderType, TransactionType, TaxType, PerTaxableType
+from types import SimpleNamespace
+from src.models import Record, GroupType, CustomerType, ProviderType, TransactionType, TaxType, PerTaxableType
 from src.orchestrator import ResearchDataOrchestrator
 
+pytestmark = pytest.mark.fast
+
 
 class TestStateTreatmentReplication:
     """Test individual methods for state treatment replication to cities."""
     
     @pytest.fixture
     def mock_lookup_tables(self):
-        """Mock LookupTables instance."""
-        lookup_tables = Mock(spec=LookupTables)
-        lookup_tables._construct_parent_geocode = Mock()
-        # Mock parent geocode construction
-        lookup_tables._construct_parent_geocode.side_effect = lambda geocode: geocode[:4] + "00000000"
-        return lookup_tables
+        """Stand-in LookupTables exposing only parent geocode construction."""
+        return SimpleNamespace(_construct_parent_geocode=lambda geocode: geocode[:4] + "00000000")
     
     @pytest.fixture
     def orchestrator(self, mock_lookup_tables):
@@ -87,6 +86,30 @@ class TestStateTreatmentReplication:
         for record in matching_records:
             assert not (record.tax_type == city_record.tax_type and record.tax_cat == city_record.tax_cat)
     
+    def test_build_state_index(self, orchestrator, sample_records):
+        """Test state records are bucketed by geocode/group/item/customer/provider."""
+        state_index = orchestrator._build_state_index(sample_records)
+
+        # City records are not indexed
+        assert all(key[0] == "US1700000000" for key in state_index)
+
+        # Records 0 and 1 share a bucket; records 2 and 3 each get their own
+        assert len(state_index) == 3
+        assert state_index[("US1700000000", "7777", "001", "99", "99")] == sample_records[0:2]
+        assert state_index[("US1700000000", "7777", "001", "0B", "99")] == [sample_records[2]]
+        assert state_index[("US1700000000", "7777", "002", "99", "99")] == [sample_records[3]]
+
+    def test_replication_with_state_index(self, orchestrator, sample_records):
+        """Test full replication pass adds each matching state treatment to the city geocode."""
+        enhanced_records, error_messages = orchestrator._replicate_state_tax_treatments_to_cities(sample_records)
+
+        # City item 001 picks up 2 state treatments, city item 002 picks up 1
+        replicated = enhanced_records[len(sample_records):]
+        assert len(replicated) == 3
+        assert {record.geocode for record in replicated} == {"US17031A0003"}
+        assert sorted((record.item, record.tax_type) for record in replicated) == [("001", "01"), ("001", "02"), ("002", "01")]
+        assert error_messages == []
+
     def test_composite_key_exclusion_logic(self, orchestrator):
         """Test that exact composite key matches are excluded."""
         city_record = Record("US17031A0003", "", "7777", "001", "99", "99", "01", 1, "01", "02", "2024-01-01", "01", "1.000000")
@@ -115,8 +138,9 @@ class TestStateTreatmentReplication:
         
         city_record = orchestrator._create_city_treatment_record(state_record, city_geocode)
         
-        # Should have city geocode
+        # Should have city geocode, with the city flag recomputed for it
         assert city_record.geocode == city_geocode
+        assert city_record.is_city and not state_record.is_city
         
         # All other fields should be identical
         assert city_record.tax_auth_id == state_record.tax_auth_id
@@ -132,6 +156,18 @@ class TestStateTreatmentReplication:
         assert city_record.per_taxable_type == state_record.per_taxable_type
         assert city_record.percent_taxable == state_record.percent_taxable
     
+    def test_with_geocode_matches_dataclasses_replace(self):
+        """Test the replication fast path copies every init field, like dataclasses.replace()."""
+        # A distinct value per field, so a field with a default that with_geocode drops shows up
+        values = {f.name: f"{f.name}-value" for f in dataclasses.fields(Record) if f.init}
+        values["geocode"] = "US1700000000"
+        state_record = Record(**values)
+        
+        city_record = state_record.with_geocode("US17031A0003")
+        
+        assert city_record == dataclasses.replace(state_record, geocode="US17031A0003")
+        assert city_record.is_city and not state_record.is_city
+    
     def test_group_missing_treatments_by_city(self, orchestrator):
         """Test grouping of missing treatments by city for error reporting."""
         missing_treatments = [
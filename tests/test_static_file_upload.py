@@ -1,6 +1,5 @@
 """Test static file upload functionality."""
 
-import asyncio
 import tempfile
 import shutil
 from pathlib import Path
@@ -9,6 +8,8 @@ import pytest
 
 from src.orchestrator import ResearchDataOrchestrator
 
+pytestmark = pytest.mark.fast
+
 
 def test_static_files_exist():
     """Test that the required static data files exist."""
@@ -56,7 +57,7 @@ async def test_upload_static_files_with_real_directory():
     """Test static file upload with the actual data directory."""
     orchestrator = ResearchDataOrchestrator()
     
-    # Mock the S3 client put_object method
+    # Mock the S3 client upload_file method
     mock_s3_client = Mock()
     orchestrator.s3_client = mock_s3_client
     
@@ -71,9 +72,12 @@ async def test_upload_static_files_with_real_directory():
         csv_files = list(data_dir.glob("*.csv"))
         expected_calls = len(csv_files)
         
-        # Check that S3 put_object was called for each CSV file
-        assert mock_s3_client.put_object.call_count == expected_calls, \
-            f"Should have called put_object {expected_calls} times"
+        # Check that S3 upload_file was called for each CSV file, streaming from disk
+        assert mock_s3_client.upload_file.call_count == expected_calls, \
+            f"Should have called upload_file {expected_calls} times"
+        mock_s3_client.put_object.assert_not_called()
+        for call in mock_s3_client.upload_file.call_args_list:
+            assert call.kwargs['ExtraArgs'] == {'ContentType': 'text/csv'}
         
         # Check that the result contains the expected number of keys
         assert len(result) == expected_calls, \
@@ -108,7 +112,8 @@ async def test_upload_static_files_missing_directory():
         assert result == [], "Should return empty list when data directory missing"
 
 
-def test_process_all_sheets_includes_static_files():
+@pytest.mark.asyncio
+async def test_process_all_sheets_includes_static_files():
     """Test that process_all_sheets includes static_file_keys in return value."""
     orchestrator = ResearchDataOrchestrator()
     
@@ -118,7 +123,7 @@ def test_process_all_sheets_includes_static_files():
     orchestrator.drive_client = mock_drive_client
     
     # Run the process (with empty file list to avoid processing)
-    result = asyncio.run(orchestrator.process_all_sheets())
+    result = await orchestrator.process_all_sheets()
     
     # Check that static_file_keys is in the result
     assert "static_file_keys" in result, "Result should include static_file_keys"
@@ -1,11 +1,43 @@
 """Tests for the new tax type expansion functionality."""
 
 import pytest
-from unittest.mock import Mock, patch
+from collections import defaultdict
+from types import MappingProxyType
+from unittest.mock import Mock
 from src.mapper import RowMapper
 from src.models import LookupTables, CustomerType, TaxableValue
 
 
+# Tax types per (geocode, tax_cat), built once; tuples since the mapper only iterates them
+_TAX_TYPES = {
+    ("US0600000000", "05"): ("01", "02", "03", "04", "05"),  # 5 tax types for category 05 in California
+    ("US0600000000", "03"): ("01", "02"),                    # 2 tax types for category 03 in California
+    ("US1200000000", "05"): ("01", "02"),                    # 2 tax types for category 05 in Florida
+    ("US1200000000", "03"): ("01",),                         # 1 tax type for category 03 in Florida
+    ("US2700000000", "05"): ("01",),                         # 1 tax type for Minnesota
+    ("US9999999999", "05"): ("01",),                         # Fallback case
+}
+_DEFAULT_TAX_TYPES = ("01",)  # Default fallback
+
+
+def _summarize(records):
+    """Group records by customer and by item, and collect tax types, in a single pass."""
+    by_customer = defaultdict(list)
+    by_item = defaultdict(list)
+    all_tax_types = set()
+    for record in records:
+        by_customer[record.customer].append(record)
+        by_item[record.item].append(record)
+        all_tax_types.add(record.tax_type)
+    return by_customer, by_item, all_tax_types
+
+
+def _row(cid, b_use="TAXABLE", b_cat="Category", b_pct="100%",
+         p_use="TAXABLE", p_cat="Category", p_pct="100%"):
+    """Build a sheet row in HEADER_MAP column order (current_id, business fields, personal fields)."""
+    return [cid, b_use, b_cat, b_pct, p_use, p_cat, p_pct]
+
+
 class MockConfig:
     """Mock configuration object for testing."""
     def __init__(self):
@@ -13,6 +45,38 @@ class MockConfig:
         self.effective_date = "1999-01-01"
 
 
+# Shared read-only test inputs (never mutated by the mapper)
+CONFIG = MockConfig()
+
+HEADER_MAP = MappingProxyType({
+    'current_id': 0,
+    'business_use': 1,
+    'business_tax_cat': 2,
+    'business_percent_tax': 3,
+    'personal_use': 4,
+    'personal_tax_cat': 5,
+    'personal_percent_tax': 6
+})
+
+# Full sheet layout with the admin filter column first, for process_sheet_rows
+SHEET_HEADER_MAP = MappingProxyType({
+    'admin': 0,
+    'current_id': 1,
+    'business_use': 2,
+    'business_tax_cat': 3,
+    'business_percent_tax': 4,
+    'personal_use': 5,
+    'personal_tax_cat': 6,
+    'personal_percent_tax': 7
+})
+
+# Two rows matching the admin filter: identical treatment, then different personal treatment
+_SHEET_ROWS = (
+    ("Tag Level", *_row("ITEM.1")),
+    ("Tag Level", *_row("ITEM.2", p_use="NOT TAXABLE", p_pct="0%")),
+)
+
+
 class TestTaxTypeExpansion:
     """Test the new tax type expansion feature."""
     
@@ -20,17 +84,12 @@ class TestTaxTypeExpansion:
     def mock_lookup_tables(self):
         """Create mock lookup tables with tax type data."""
         lookup_tables = Mock(spec=LookupTables)
-        lookup_tables.get_tax_cat_code = Mock(return_value="05")
-        # Mock different tax types for different geocodes using the new hierarchy fallback method
-        lookup_tables.get_tax_types_with_hierarchy_fallback = Mock(side_effect=lambda geocode, tax_cat: {
-            # Different tax types for different geocode+tax_cat combinations
-            ("US0600000000", "05"): ["01", "02", "03", "04", "05"],  # 5 tax types for category 05 in California
-            ("US0600000000", "03"): ["01", "02"],                    # 2 tax types for category 03 in California
-            ("US1200000000", "05"): ["01", "02"],                    # 2 tax types for category 05 in Florida
-            ("US1200000000", "03"): ["01"],                          # 1 tax type for category 03 in Florida
-            ("US2700000000", "05"): ["01"],                          # 1 tax type for Minnesota
-            ("US9999999999", "05"): ["01"]                           # Fallback case
-        }.get((geocode, tax_cat), ["01"]))  # Default fallback
+        # Plain callables: no test asserts on these calls, so skip Mock's call recording
+        lookup_tables.get_tax_cat_code = lambda tax_cat_desc: "05"
+        # Different tax types for different geocodes using the new hierarchy fallback method
+        lookup_tables.get_tax_types_with_hierarchy_fallback = (
+            lambda geocode, tax_cat: _TAX_TYPES.get((geocode, tax_cat), _DEFAULT_TAX_TYPES)
+        )
         return lookup_tables
     
     @pytest.fixture
@@ -38,42 +97,16 @@ class TestTaxTypeExpansion:
         """Create a RowMapper instance with mock dependencies."""
         return RowMapper(mock_lookup_tables)
     
-    @pytest.fixture
-    def config(self):
-        """Create mock config."""
-        return MockConfig()
-    
-    @pytest.fixture
-    def header_map(self):
-        """Standard header mapping for tests."""
-        return {
-            'current_id': 0,
-            'business_use': 1,
-            'business_tax_cat': 2,
-            'business_percent_tax': 3,
-            'personal_use': 4,
-            'personal_tax_cat': 5,
-            'personal_percent_tax': 6
-        }
-    
-    def test_identical_treatment_creates_multiple_tax_types(self, row_mapper, config, header_map):
+    def test_identical_treatment_creates_multiple_tax_types(self, row_mapper):
         """Test that identical treatment creates only 99 records but multiplied by tax types."""
         # Row with identical business and personal treatment
-        row = [
-            "1.1.1.1.0.0.0.0",    # current_id
-            "TAXABLE",            # business_use
-            "Category",           # business_tax_cat
-            "100%",               # business_percent_tax
-            "TAXABLE",            # personal_use (same)
-            "Category",           # personal_tax_cat (same)
-            "100%"                # personal_percent_tax (same)
-        ]
+        row = _row("1.1.1.1.0.0.0.0")
         
         geocode = "US0600000000"  # Has 5 tax types: ["01", "02", "03", "04", "05"]
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, geocode, config
+            row, HEADER_MAP, geocode, CONFIG
         )
         
         # Should create only personal template (deduplication logic)
@@ -97,27 +130,18 @@ class TestTaxTypeExpansion:
             assert record.percent_taxable == "1.000000"
         
         # Check that tax_types are correct
-        tax_types = [record.tax_type for record in expanded_records]
-        assert sorted(tax_types) == ["01", "02", "03", "04", "05"]
+        assert sorted(record.tax_type for record in expanded_records) == ["01", "02", "03", "04", "05"]
     
-    def test_different_treatment_creates_multiple_tax_types_for_both(self, row_mapper, config, header_map):
+    def test_different_treatment_creates_multiple_tax_types_for_both(self, row_mapper):
         """Test that different treatment creates both 0B and 99 records multiplied by tax types."""
         # Row with different business and personal treatment
-        row = [
-            "2.2.2.2.0.0.0.0",    # current_id
-            "TAXABLE",            # business_use
-            "Category",           # business_tax_cat
-            "100%",               # business_percent_tax
-            "NOT TAXABLE",        # personal_use (different)
-            "Category",           # personal_tax_cat
-            "0%"                  # personal_percent_tax (different)
-        ]
+        row = _row("2.2.2.2.0.0.0.0", p_use="NOT TAXABLE", p_pct="0%")
         
         geocode = "US1200000000"  # Has 2 tax types: ["01", "02"]
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, geocode, config
+            row, HEADER_MAP, geocode, CONFIG
         )
         
         # Should create both templates (different treatment)
@@ -133,8 +157,9 @@ class TestTaxTypeExpansion:
         assert len(expanded_records) == 4
         
         # Separate business and personal records
-        business_records = [r for r in expanded_records if r.customer == "0B"]
-        personal_records = [r for r in expanded_records if r.customer == "99"]
+        by_customer, _, _ = _summarize(expanded_records)
+        business_records = by_customer["0B"]
+        personal_records = by_customer["99"]
         
         assert len(business_records) == 2  # 2 tax types
         assert len(personal_records) == 2  # 2 tax types
@@ -152,30 +177,19 @@ class TestTaxTypeExpansion:
             assert record.percent_taxable == "0.000000"
         
         # Check tax types for both customer types
-        business_tax_types = sorted([r.tax_type for r in business_records])
-        personal_tax_types = sorted([r.tax_type for r in personal_records])
-        
-        assert business_tax_types == ["01", "02"]
-        assert personal_tax_types == ["01", "02"]
+        assert sorted(r.tax_type for r in business_records) == ["01", "02"]
+        assert sorted(r.tax_type for r in personal_records) == ["01", "02"]
     
-    def test_single_tax_type_geocode(self, row_mapper, config, header_map):
+    def test_single_tax_type_geocode(self, row_mapper):
         """Test geocode with only one tax type behaves like before."""
-        # Row with only business valid
-        row = [
-            "3.3.3.3.0.0.0.0",    # current_id
-            "TAXABLE",            # business_use
-            "Category",           # business_tax_cat
-            "100%",               # business_percent_tax
-            "TO RESEARCH",        # personal_use (uncertain - will be skipped)
-            "Category",           # personal_tax_cat
-            "50%"                 # personal_percent_tax
-        ]
+        # Row with only business valid (personal use is uncertain and will be skipped)
+        row = _row("3.3.3.3.0.0.0.0", p_use="TO RESEARCH", p_pct="50%")
         
         geocode = "US2700000000"  # Has 1 tax type: ["01"]
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, geocode, config
+            row, HEADER_MAP, geocode, CONFIG
         )
         
         # Should create only business template
@@ -195,48 +209,13 @@ class TestTaxTypeExpansion:
         assert record.tax_type == "01"
         assert record.taxable == TaxableValue.TAXABLE.value
     
-    def test_process_sheet_rows_with_tax_type_expansion(self, row_mapper, config):
+    def test_process_sheet_rows_with_tax_type_expansion(self, row_mapper):
         """Test that process_sheet_rows correctly uses tax type expansion."""
-        header_map = {
-            'admin': 0,
-            'current_id': 1,
-            'business_use': 2,
-            'business_tax_cat': 3,
-            'business_percent_tax': 4,
-            'personal_use': 5,
-            'personal_tax_cat': 6,
-            'personal_percent_tax': 7
-        }
-        
-        # Two rows: one with identical treatment, one with different treatment
-        rows = [
-            [
-                "Tag Level",          # admin (matches filter)
-                "ITEM.1",             # current_id
-                "TAXABLE",            # business_use
-                "Category",           # business_tax_cat
-                "100%",               # business_percent_tax
-                "TAXABLE",            # personal_use (same treatment)
-                "Category",           # personal_tax_cat
-                "100%"                # personal_percent_tax
-            ],
-            [
-                "Tag Level",          # admin (matches filter)
-                "ITEM.2",             # current_id
-                "TAXABLE",            # business_use
-                "Category",           # business_tax_cat
-                "100%",               # business_percent_tax
-                "NOT TAXABLE",        # personal_use (different treatment)
-                "Category",           # personal_tax_cat
-                "0%"                  # personal_percent_tax
-            ]
-        ]
-        
-        # Mock geocode lookup to return a list with geocode with 5 tax types
-        with patch.object(row_mapper.lookup_tables, 'get_geocodes_for_location', return_value=["US0600000000"]):
-            records, error, processing_errors = row_mapper.process_sheet_rows(
-                rows, header_map, "Test File.xlsx", config
-            )
+        # Geocode lookup returns a geocode with 5 tax types; the fixture is per-test, so no patch to undo
+        row_mapper.lookup_tables.get_geocodes_for_location = lambda filename: ("US0600000000",)
+        records, error, processing_errors = row_mapper.process_sheet_rows(
+            _SHEET_ROWS, SHEET_HEADER_MAP, "Test File.xlsx", CONFIG
+        )
         
         assert error is None
         
@@ -245,41 +224,29 @@ class TestTaxTypeExpansion:
         # Total: 5 + 10 = 15 records
         assert len(records) == 15
         
-        # Count by customer type
-        business_records = [r for r in records if r.customer == "0B"]
-        personal_records = [r for r in records if r.customer == "99"]
+        by_customer, by_item, all_tax_types = _summarize(records)
         
-        assert len(business_records) == 5   # Only from second row (different treatment)
-        assert len(personal_records) == 10  # From both rows
+        # Count by customer type
+        assert len(by_customer["0B"]) == 5   # Only from second row (different treatment)
+        assert len(by_customer["99"]) == 10  # From both rows
         
         # Check that all tax types are represented
-        all_tax_types = set(r.tax_type for r in records)
         assert all_tax_types == {"01", "02", "03", "04", "05"}
         
         # Check specific items
-        item1_records = [r for r in records if r.item == "ITEM.1"]
-        item2_records = [r for r in records if r.item == "ITEM.2"]
-        
-        assert len(item1_records) == 5   # Only personal records (identical treatment)
-        assert len(item2_records) == 10  # Both business and personal (different treatment)
+        assert len(by_item["ITEM.1"]) == 5   # Only personal records (identical treatment)
+        assert len(by_item["ITEM.2"]) == 10  # Both business and personal (different treatment)
     
-    def test_fallback_tax_type_for_unknown_geocode(self, row_mapper, config, header_map):
+    def test_fallback_tax_type_for_unknown_geocode(self, row_mapper):
         """Test that unknown geocodes fallback to tax_type '01'."""
-        row = [
-            "4.4.4.4.0.0.0.0",    # current_id
-            "TAXABLE",            # business_use
-            "Category",           # business_tax_cat
-            "100%",               # business_percent_tax
-            "",                   # personal_use (empty)
-            "",                   # personal_tax_cat
-            ""                    # personal_percent_tax
-        ]
+        # Personal fields left empty
+        row = _row("4.4.4.4.0.0.0.0", p_use="", p_cat="", p_pct="")
         
         unknown_geocode = "US9999999999"  # Not in our mock data
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, unknown_geocode, config
+            row, HEADER_MAP, unknown_geocode, CONFIG
         )
         
         # Should create only business template
@@ -298,24 +265,17 @@ class TestTaxTypeExpansion:
         assert record.tax_type == "01"  # Fallback value
         assert record.customer == CustomerType.BUSINESS.value
     
-    def test_no_records_created_returns_empty_list(self, row_mapper, config, header_map):
+    def test_no_records_created_returns_empty_list(self, row_mapper):
         """Test that when no records are created, expansion returns empty list."""
         # Row with uncertain values for both business and personal
-        row = [
-            "5.5.5.5.0.0.0.0",    # current_id
-            "TO RESEARCH",        # business_use (uncertain)
-            "Category",           # business_tax_cat
-            "invalid%",           # business_percent_tax (invalid)
-            "DRILL DOWN",         # personal_use (uncertain)
-            "Category",           # personal_tax_cat
-            "bad_percent"         # personal_percent_tax (invalid)
-        ]
+        row = _row("5.5.5.5.0.0.0.0", b_use="TO RESEARCH", b_pct="invalid%",
+                   p_use="DRILL DOWN", p_pct="bad_percent")
         
         geocode = "US0600000000"
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, geocode, config
+            row, HEADER_MAP, geocode, CONFIG
         )
         
         # Should create no templates
@@ -330,40 +290,23 @@ class TestTaxTypeExpansion:
         # Should create no records
         assert len(expanded_records) == 0
 
-    def test_different_tax_categories_create_different_tax_types(self, row_mapper, config):
+    def test_different_tax_categories_create_different_tax_types(self, row_mapper):
         """Test that business and personal records with different tax categories get different tax types."""
         # Mock different tax categories for business vs personal
-        row_mapper.lookup_tables.get_tax_cat_code = Mock(side_effect=lambda desc: {
+        tax_cat_codes = {
             "Business Category": "05",   # Business gets tax_cat 05
             "Personal Category": "03"    # Personal gets tax_cat 03
-        }.get(desc, "00"))
-        
-        header_map = {
-            'current_id': 0,
-            'business_use': 1,
-            'business_tax_cat': 2,
-            'business_percent_tax': 3,
-            'personal_use': 4,
-            'personal_tax_cat': 5,
-            'personal_percent_tax': 6
         }
+        row_mapper.lookup_tables.get_tax_cat_code = lambda desc: tax_cat_codes.get(desc, "00")
         
         # Row with different business and personal tax categories
-        row = [
-            "ITEM.DIFF",           # current_id
-            "TAXABLE",            # business_use
-            "Business Category",  # business_tax_cat (will map to "05")
-            "100%",               # business_percent_tax
-            "TAXABLE",            # personal_use 
-            "Personal Category",  # personal_tax_cat (will map to "03")
-            "100%"                # personal_percent_tax
-        ]
+        row = _row("ITEM.DIFF", b_cat="Business Category", p_cat="Personal Category")
         
         geocode = "US0600000000"  # California
         
         # Get template records first
         business_record, personal_record = row_mapper.convert_row_to_records(
-            row, header_map, geocode, config, "test_file"
+            row, HEADER_MAP, geocode, CONFIG, "test_file"
         )
         
         # Should create both templates (same taxable/percent but different tax_cat)
@@ -383,19 +326,18 @@ class TestTaxTypeExpansion:
         assert len(expanded_records) == 7
         
         # Separate business and personal records
-        business_records = [r for r in expanded_records if r.customer == "0B"]
-        personal_records = [r for r in expanded_records if r.customer == "99"]
+        by_customer, _, _ = _summarize(expanded_records)
+        business_records = by_customer["0B"]
+        personal_records = by_customer["99"]
         
         assert len(business_records) == 5  # 5 tax types for tax_cat=05
         assert len(personal_records) == 2  # 2 tax types for tax_cat=03
         
         # Check business tax types (should be all 5)
-        business_tax_types = sorted([r.tax_type for r in business_records])
-        assert business_tax_types == ["01", "02", "03", "04", "05"]
+        assert sorted(r.tax_type for r in business_records) == ["01", "02", "03", "04", "05"]
         
         # Check personal tax types (should be only 2)
-        personal_tax_types = sorted([r.tax_type for r in personal_records])
-        assert personal_tax_types == ["01", "02"]
+        assert sorted(r.tax_type for r in personal_records) == ["01", "02"]
         
         # Verify tax_cat values are preserved
         for record in business_records:
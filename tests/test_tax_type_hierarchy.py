@@ -8,13 +8,14 @@ from src.models import LookupTables
 class TestTaxTypeHierarchy:
     """Test tax type hierarchy fallback logic for city geocodes."""
     
-    @pytest.fixture
+    # Lookup data is constant and never mutated by these tests, so it is parsed once per module
+    @pytest.fixture(scope="module")
     def mock_s3_client(self):
         """Mock S3 client for testing."""
         mock_client = Mock()
         return mock_client
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def mock_geo_csv_content(self):
         """Mock geo_state.csv content."""
         return '''geocode,state,county,city,tax_district,jurisdiction
@@ -23,7 +24,7 @@ US0800000000,CO,,,,STATE
 US08013A0025,CO,BOULDER,BOULDER,,CITY
 US17031A0003,IL,COOK,CHICAGO,,CITY'''
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def mock_tax_type_csv_content(self):
         """Mock unique_tax_type.csv content with hierarchy scenarios."""
         return '''geocode,tax_cat,tax_type
@@ -37,27 +38,30 @@ US08013A0025,01,01
 US08013A0025,01,04
 US17031A0047,01,47'''
     
-    @pytest.fixture  
+    @pytest.fixture(scope="module")
     def mock_tax_cat_csv_content(self):
         """Mock tax_cat.csv content."""
         return '''tax_cat,tax_cat_desc
 01,General Sales Tax
 02,Special Tax'''
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def lookup_tables(self, mock_s3_client, mock_geo_csv_content, mock_tax_type_csv_content, mock_tax_cat_csv_content):
         """Create LookupTables instance with mocked S3 data."""
+        # Responses are built once per key; each S3 read is then a dict lookup
+        responses = {
+            key: {'Body': Mock(read=Mock(return_value=content.encode('utf-8')))}
+            for key, content in (
+                ("mapping/geo_state.csv", mock_geo_csv_content),
+                ("mapping/unique_tax_type.csv", mock_tax_type_csv_content),
+                ("mapping/tax_cat.csv", mock_tax_cat_csv_content),
+            )
+        }
+        
         def mock_get_object(Bucket, Key):
-            mock_response = {'Body': Mock()}
-            if Key == "mapping/geo_state.csv":
-                mock_response['Body'].read.return_value = mock_geo_csv_content.encode('utf-8')
-            elif Key == "mapping/unique_tax_type.csv":
-                mock_response['Body'].read.return_value = mock_tax_type_csv_content.encode('utf-8')
-            elif Key == "mapping/tax_cat.csv":
-                mock_response['Body'].read.return_value = mock_tax_cat_csv_content.encode('utf-8')
-            else:
+            if Key not in responses:
                 raise Exception(f"Unexpected S3 key: {Key}")
-            return mock_response
+            return responses[Key]
         
         with patch('src.models.boto3.client', return_value=mock_s3_client):
             mock_s3_client.get_object.side_effect = mock_get_object
@@ -84,105 +88,28 @@ US17031A0047,01,47'''
         assert lookup_tables._construct_parent_geocode("US08") == "US0800000000"
         assert lookup_tables._construct_parent_geocode("AB") == "AB0000000000"  # Should handle gracefully
     
-    def test_direct_city_lookup_success(self, lookup_tables):
-        """Test direct tax type lookup succeeds for city geocodes."""
-        # US08013A0025 (Boulder, CO) has direct entries in tax type CSV
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]  # Should return city-specific tax types
-        
-        # Should NOT fall back to parent state even though parent has different tax types
-        # (Parent US0800000000 has ["01", "02", "03"] but we should use ONLY city types)
-    
-    def test_no_fallback_returns_none(self, lookup_tables):
-        """Test that no fallback occurs when city has no direct match - returns None instead."""
-        # US17031A0003 (Chicago, IL) has NO direct entries, should return None (no fallback)
-        # Parent US1700000000 has ["01", "02", "47"] but fallback is disabled
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US17031A0003", "01")
-        assert tax_types is None  # Should return None (no fallback to parent)
-    
-    def test_no_match_returns_none(self, lookup_tables):
-        """Test that no match in both city and parent returns None."""
-        # Use a geocode with no direct match and parent has no match for tax_cat
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US17031A0003", "99")
-        assert tax_types is None
-        
-        # Use completely unknown geocode
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US99999Z9999", "01")
-        assert tax_types is None
-    
-    def test_case_insensitive_matching(self, lookup_tables):
-        """Test that tax type lookup is case insensitive."""
-        # Test various case combinations
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("us08013a0025", "01")
-        assert tax_types == ["01", "04"]
-        
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]
-        
-        # Test tax_cat case insensitivity
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]
-    
-    def test_exclusive_or_logic(self, lookup_tables):
-        """Test that results from city and parent are never combined (exclusive OR)."""
-        # US08013A0025 (Boulder) has ["01", "04"]
-        # Its parent US0800000000 (CO) has ["01", "02", "03"]  
-        # Should return ONLY city results, NOT combined
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]
-        assert "02" not in tax_types  # Should NOT include parent tax types
-        assert "03" not in tax_types  # Should NOT include parent tax types
-        
-        # When city has no match, should return None (no fallback)
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US17031A0003", "01")
-        assert tax_types is None  # No fallback to parent results
-    
-    def test_tax_type_sorting(self, lookup_tables):
-        """Test that tax types are returned in sorted order."""
-        # Tax types should be sorted for consistent ordering
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]  # Should be sorted
-    
-    def test_empty_geocode_and_tax_cat(self, lookup_tables):
-        """Test handling of empty geocode and tax_cat values."""
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("", "01")
-        assert tax_types is None
-        
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "")
-        assert tax_types is None
-        
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("", "")
-        assert tax_types is None
-    
-    def test_whitespace_handling(self, lookup_tables):
-        """Test that whitespace is properly stripped in lookups."""
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback(" US08013A0025 ", " 01 ")
-        assert tax_types == ["01", "04"]
-    
-    def test_multiple_lookup_scenarios(self, lookup_tables):
-        """Test various geocode scenarios for comprehensive coverage."""
-        # Scenario 1: City with direct match
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US08013A0025", "01")
-        assert tax_types == ["01", "04"]
-        
-        # Scenario 2: City without direct match (no fallback - returns None)
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US17031A0003", "01")
-        assert tax_types is None
-        
-        # Scenario 3: City without direct match for unknown tax_cat
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US17031A0003", "99")
-        assert tax_types is None
-        
-        # Scenario 4: State-level geocode (direct lookup)
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US1700000000", "01")
-        assert tax_types == ["01", "02", "47"]
-    
-    def test_parent_geocode_same_as_city(self, lookup_tables):
-        """Test handling when constructed parent geocode is same as city geocode."""
-        # This tests the edge case where parent_geocode == geocode
-        # Should not attempt parent lookup when they're the same
-        tax_types = lookup_tables.get_tax_types_with_hierarchy_fallback("US0800000000", "01")
-        assert tax_types == ["01", "02", "03"]  # State-level lookup, no fallback needed
+    @pytest.mark.parametrize("geocode, tax_cat, expected", [
+        # City with direct entries: ONLY city types, sorted, never combined with parent ["01", "02", "03"]
+        pytest.param("US08013A0025", "01", ["01", "04"], id="direct-city-match"),
+        # City without direct entries: no fallback to parent ["01", "02", "47"]
+        pytest.param("US17031A0003", "01", None, id="no-fallback-to-parent"),
+        # No match for city or parent tax_cat
+        pytest.param("US17031A0003", "99", None, id="unknown-tax-cat"),
+        pytest.param("US99999Z9999", "01", None, id="unknown-geocode"),
+        # Case insensitive and whitespace-stripped matching
+        pytest.param("us08013a0025", "01", ["01", "04"], id="case-insensitive"),
+        pytest.param(" US08013A0025 ", " 01 ", ["01", "04"], id="whitespace-stripped"),
+        # Empty geocode and/or tax_cat
+        pytest.param("", "01", None, id="empty-geocode"),
+        pytest.param("US08013A0025", "", None, id="empty-tax-cat"),
+        pytest.param("", "", None, id="empty-both"),
+        # State-level geocodes (parent geocode is the geocode itself): direct lookup
+        pytest.param("US1700000000", "01", ["01", "02", "47"], id="state-il"),
+        pytest.param("US0800000000", "01", ["01", "02", "03"], id="state-co"),
+    ])
+    def test_hierarchy_lookup(self, lookup_tables, geocode, tax_cat, expected):
+        """Test tax type lookup is direct-only (no parent fallback), normalized and sorted."""
+        assert lookup_tables.get_tax_types_with_hierarchy_fallback(geocode, tax_cat) == expected
     
 
 if __name__ == "__main__":